@@ -0,0 +1,175 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+import uuid
+
+
+# ffmpeg arguments per derived artifact: output suffix and options. The GIF
+# uses a generated palette, which is far smaller and cleaner than the default.
+TRANSCODES = {
+    'gif': ('.gif', ['-vf', 'fps=8,scale=480:-1:flags=lanczos,split[a][b];[a]palettegen[p];[b][p]paletteuse']),
+    'thumbnail': ('.jpg', ['-vf', 'thumbnail,scale=320:-1', '-frames:v', '1']),
+    'mp4': ('.mp4', ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '32', '-pix_fmt', 'yuv420p', '-an']),
+}
+
+
+class ArtifactManager:
+    # Owns the recordings directory. Every recorded run gets a run id and a
+    # row in manifest.sqlite, so finding a run's files never scans the
+    # directory and worker processes can share it. Derived files (GIF,
+    # thumbnail, a compressed MP4 that replaces the WebM) are produced by
+    # ffmpeg on a small thread pool while the next extraction runs. The
+    # oldest recordings are deleted once they pass `max_age` seconds or the
+    # directory passes `max_bytes`.
+
+    def __init__(self, directory='videos', transcodes=(), workers=2, max_age=None, max_bytes=None):
+        unknown = set(transcodes) - set(TRANSCODES)
+        if unknown:
+            raise ValueError(f"unknown video artifacts {', '.join(sorted(unknown))}; choose from {', '.join(TRANSCODES)}")
+        self.ffmpeg = shutil.which('ffmpeg')
+        if transcodes and self.ffmpeg is None:
+            raise RuntimeError("Video transcoding needs ffmpeg on PATH")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.transcodes = tuple(transcodes)
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.transcoded = 0
+        self.transcode_failures = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._db = sqlite3.connect(os.path.join(directory, 'manifest.sqlite'), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id TEXT PRIMARY KEY,"
+            " url TEXT NOT NULL,"
+            " failed INTEGER NOT NULL,"
+            " created REAL NOT NULL,"
+            " video TEXT,"
+            " gif TEXT,"
+            " thumbnail TEXT,"
+            " bytes INTEGER NOT NULL,"
+            " pending INTEGER NOT NULL,"
+            " errors TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS runs_created ON runs (created)")
+        self._db.commit()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='transcode') if transcodes else None
+        self.enforce_retention()
+
+    def _path(self, run_id, suffix):
+        return os.path.join(self.directory, run_id + suffix)
+
+    def register(self, url, video, failed=False):
+        # Moves a finished recording to <run_id>.webm, records it and queues
+        # its transcodes. Returns the run's entry with the paths the files
+        # will have once they are written: with the MP4 queued, `video` is
+        # the .mp4 that replaces the WebM. `settle` gives the final entry.
+        run_id = uuid.uuid4().hex[:12]
+        path = self._path(run_id, os.path.splitext(video)[1] or '.webm')
+        os.replace(video, path)
+        entry = {'run_id': run_id, 'url': url, 'failed': failed, 'created': time.time(), 'video': path,
+                 'gif': None, 'thumbnail': None, 'bytes': os.path.getsize(path), 'pending': bool(self.transcodes)}
+        for kind in ('gif', 'thumbnail'):
+            if kind in self.transcodes:
+                entry[kind] = self._path(run_id, TRANSCODES[kind][0])
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO runs (run_id, url, failed, created, video, gif, thumbnail, bytes, pending)"
+                " VALUES (:run_id, :url, :failed, :created, :video, :gif, :thumbnail, :bytes, :pending)",
+                entry
+            )
+            self._db.commit()
+            if self._executor is not None:
+                self._pending[run_id] = self._executor.submit(self._transcode, run_id, path)
+        self.enforce_retention()
+        if 'mp4' in self.transcodes:
+            entry['video'] = self._path(run_id, TRANSCODES['mp4'][0])
+        return entry
+
+    def settle(self, run_id):
+        # Blocks until the run's transcodes are done and returns its manifest
+        # row, which holds the files that were actually written: the WebM
+        # stays when the MP4 fails, and failed derived files are None.
+        future = self._pending.pop(run_id, None)
+        if future is not None:
+            future.result()
+        return self.get(run_id)
+
+    def _transcode(self, run_id, source):
+        # Runs on the pool. The MP4 goes last because it replaces the source.
+        video, errors, size = source, {}, 0
+        for kind in sorted(self.transcodes, key=lambda kind: kind == 'mp4'):
+            suffix, options = TRANSCODES[kind]
+            target = self._path(run_id, suffix)
+            command = [self.ffmpeg, '-y', '-loglevel', 'error', '-i', source, *options, target]
+            result = subprocess.run(command, capture_output=True, text=True)
+            if result.returncode != 0 or not os.path.exists(target):
+                self.transcode_failures += 1
+                errors[kind] = result.stderr.strip()[-500:]
+                continue
+            self.transcoded += 1
+            if kind == 'mp4':
+                os.remove(source)
+                video = target
+            size += os.path.getsize(target) if kind != 'mp4' else 0
+        with self._lock:
+            self._db.execute(
+                "UPDATE runs SET video = ?, bytes = ?, pending = 0, errors = ?,"
+                " gif = CASE WHEN ? THEN NULL ELSE gif END,"
+                " thumbnail = CASE WHEN ? THEN NULL ELSE thumbnail END WHERE run_id = ?",
+                (video, os.path.getsize(video) + size, json.dumps(errors) if errors else None,
+                 'gif' in errors, 'thumbnail' in errors, run_id)
+            )
+            self._db.commit()
+            self._pending.pop(run_id, None)
+
+    def get(self, run_id):
+        with self._lock:
+            cursor = self._db.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([column[0] for column in cursor.description], row))
+
+    def enforce_retention(self):
+        # Oldest runs go first; runs still waiting for a transcode are kept.
+        if self.max_age is None and self.max_bytes is None:
+            return
+        now = time.time()
+        with self._lock:
+            total = self._db.execute("SELECT COALESCE(SUM(bytes), 0) FROM runs").fetchone()[0]
+            rows = self._db.execute(
+                "SELECT run_id, created, video, gif, thumbnail, bytes FROM runs WHERE pending = 0 ORDER BY created"
+            ).fetchall()
+            for run_id, created, *paths, size in rows:
+                expired = self.max_age is not None and now - created > self.max_age
+                oversize = self.max_bytes is not None and total > self.max_bytes
+                if not (expired or oversize):
+                    break
+                for path in paths:
+                    if path:
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+                self._db.execute("DELETE FROM runs WHERE run_id = ?", (run_id,))
+                total -= size
+                self.evicted += 1
+            self._db.commit()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        self.enforce_retention()
+        self._db.close()
+
+    def stats(self):
+        return {'transcoded': self.transcoded, 'transcode_failures': self.transcode_failures, 'evicted': self.evicted}
@@ -0,0 +1,308 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import asyncio
+import json
+import sys
+import threading
+import time
+
+from browser_pool import BrowserPool
+from fake_llm import FakeLLM, make_catalogue
+from fetcher import HttpFetcher
+from profiles import load_profile
+from rate_limit import DomainScheduler
+from llm_batch import LLMBatcher
+from model_router import ModelRouter
+from run_agent import Extractor, build_browser_config, run_batch
+from site_templates import TEMPLATES
+from tracing import TracedLLM, Tracer
+
+
+RATING_WORDS = ['One', 'Two', 'Three', 'Four', 'Five']
+
+
+def peak_rss_mb():
+    # The process high-water mark so far, or None where it cannot be read.
+    # psutil works everywhere (peak_wset on Windows); the resource module
+    # is the POSIX fallback, with ru_maxrss in KB on Linux and bytes on macOS.
+    try:
+        import psutil
+        memory = psutil.Process().memory_info()
+        peak = getattr(memory, 'peak_wset', None)
+        if peak is not None:
+            return round(peak / 2 ** 20, 1)
+    except ImportError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 1024), 1)
+
+PRODUCT_PAGE = """<!DOCTYPE html>
+<html><head><title>{title} | Books to Scrape - Sandbox</title>
+<link rel="stylesheet" href="/static/style.css"></head>
+<body>
+<header class="header container-fluid"><div class="page_inner"><a href="/index.html">Books to Scrape</a></div></header>
+<div class="page_inner">
+<ul class="breadcrumb"><li><a href="/index.html">Home</a></li><li class="active">{title}</li></ul>
+<aside class="sidebar"><div class="side_categories"><ul><li><a href="/catalogue/category/books_1/index.html">Books</a><ul>
+{categories}
+</ul></li></ul></div></aside>
+<article class="product_page">
+<div class="row"><div class="col-sm-6 product_main">
+<h1>{title}</h1>
+<p class="price_color">&pound;{price:.2f}</p>
+<p class="instock availability"><i class="icon-ok"></i> {availability}</p>
+<p class="star-rating {rating_word}"><i class="icon-star"></i></p>
+</div></div>
+<div id="product_description" class="sub-header"><h2>Product Description</h2></div>
+<p>{description}</p>
+</article>
+</div>
+<footer class="footer container-fluid">Benchmark catalogue, generated locally.</footer>
+</body></html>
+"""
+
+
+def render_product(book, category_links):
+    categories = "\n".join(
+        f'<li><a href="/catalogue/category/books/cat-{i}/index.html">Category {i}</a></li>'
+        for i in range(category_links)
+    )
+    return PRODUCT_PAGE.format(rating_word=RATING_WORDS[book['rating'] - 1], categories=categories, **book)
+
+
+class MockBookstore:
+    # A local copy of a books.toscrape.com-style catalogue served over HTTP
+    # from a background thread, with a fixed delay per response.
+
+    def __init__(self, books, latency=0.0, category_links=50):
+        self.books = books
+        self.latency = latency
+        self.category_links = category_links
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        store = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if store.latency:
+                    time.sleep(store.latency)
+                book = store.books.get(self.path)
+                if book is None:
+                    self.send_error(404)
+                    return
+                body = render_product(book, store.category_links).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def urls(self):
+        return [self.base_url + path for path in self.books]
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class TimedExtractor:
+
+    def __init__(self, extractor):
+        self.extractor = extractor
+
+    async def extract(self, url):
+        started = time.perf_counter()
+        record = await self.extractor.extract(url)
+        record['latency'] = time.perf_counter() - started
+        return record
+
+
+MODES = {
+    'template': ('template', 'http_llm', 'browser'),
+    'llm': ('http_llm',),
+    'browser': ('browser',),
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def parse_models(value):
+    # "name:latency[:failure_rate]" per model, cheapest first.
+    models = []
+    for spec in value.split(','):
+        name, latency, *rest = spec.split(':')
+        models.append((name, float(latency), float(rest[0]) if rest else 0.0))
+    return models
+
+
+async def run_level(store, books, concurrency, args):
+    tracer = Tracer()
+    router = None
+    if args.models:
+        fakes = [FakeLLM(books, latency, name, failure_rate, args.llm_tail_rate, args.seed)
+                 for name, latency, failure_rate in args.models]
+        llm = router = ModelRouter(fakes, tracer, hedge=not args.no_hedge)
+    else:
+        fakes = [FakeLLM(books, latency=args.llm_latency, tail_rate=args.llm_tail_rate, seed=args.seed)]
+        llm = fakes[0]
+    profile = load_profile('production')
+    pool = BrowserPool.from_browser_config(
+        build_browser_config(profile),
+        size=args.browsers,
+        max_contexts_per_browser=max(1, concurrency // args.browsers),
+        tracer=tracer
+    )
+    fetcher = HttpFetcher(DomainScheduler(qps=None, concurrency=concurrency, respect_robots=False))
+    traced_llm = TracedLLM(llm, tracer)
+    extractor = Extractor(
+        traced_llm, pool, fetcher, profile, tracer,
+        ready_timeout=args.ready_timeout,
+        tiers=MODES[args.mode],
+        batcher=LLMBatcher(traced_llm, tracer, args.llm_batch) if args.llm_batch > 1 else None
+    )
+
+    latencies = []
+    failures = 0
+    urls = store.urls()
+    started = time.perf_counter()
+    if args.mode == 'browser':
+        await pool.start()
+    try:
+        async for record in run_batch(urls, TimedExtractor(extractor), concurrency):
+            if 'error' in record:
+                failures += 1
+            else:
+                latencies.append(record['latency'])
+    finally:
+        if args.mode == 'browser':
+            await pool.close()
+        await extractor.close()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'concurrency': concurrency,
+        'pages': len(urls),
+        'failures': failures,
+        'pages_per_sec': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+        'peak_rss_mb': peak_rss_mb(),
+        'tokens_per_page': round(sum(fake.prompt_tokens + fake.completion_tokens for fake in fakes) / max(1, len(urls)), 1),
+        'llm_calls': sum(fake.calls for fake in fakes),
+        'models': router.stats() if router is not None else {},
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    previous = {row['concurrency']: row for row in baseline['results']}
+    for row in results:
+        old = previous.get(row['concurrency'])
+        if old is None:
+            continue
+        if row['pages_per_sec'] < old['pages_per_sec'] * (1 - tolerance):
+            regressions.append(f"c={row['concurrency']}: pages/sec {old['pages_per_sec']} -> {row['pages_per_sec']}")
+        if row['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            regressions.append(f"c={row['concurrency']}: p95 {old['p95_ms']} ms -> {row['p95_ms']} ms")
+        if row['tokens_per_page'] > old['tokens_per_page'] * (1 + tolerance):
+            regressions.append(f"c={row['concurrency']}: tokens/page {old['tokens_per_page']} -> {row['tokens_per_page']}")
+    return regressions
+
+
+async def main(args):
+    books = make_catalogue(args.pages, args.description_words, seed=args.seed)
+    store = MockBookstore(books, latency=args.server_latency, category_links=args.category_links).start()
+    # The mock store uses the books.toscrape.com layout.
+    TEMPLATES['127.0.0.1'] = TEMPLATES['books.toscrape.com']
+
+    if args.models:
+        llm_config = "models " + ", ".join(f"{name} {latency}s ({failure_rate:.0%} failing)" for name, latency, failure_rate in args.models)
+    else:
+        llm_config = f"LLM latency {args.llm_latency}s"
+    print(f"Benchmark: {args.pages} pages, mode {args.mode}, server latency {args.server_latency}s, {llm_config}")
+    print(f"{'conc':>5} {'pages/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'rss MB':>8} {'tok/page':>9} {'fail':>5}")
+    results = []
+    try:
+        for concurrency in args.concurrency:
+            row = await run_level(store, books, concurrency, args)
+            results.append(row)
+            print(f"{row['concurrency']:>5} {row['pages_per_sec']:>9} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+                  f"{row['peak_rss_mb'] or '-':>8} {row['tokens_per_page']:>9} {row['failures']:>5}")
+            for model, model_stats in row['models'].items():
+                answered = model_stats['ok'] + model_stats['failed']
+                print(f"{'':>5} {model}: {model_stats['calls']} calls, {model_stats['ok'] / max(1, answered):.0%} ok, "
+                      f"avg {model_stats['total_ms'] / max(1, model_stats['ok']):.0f} ms, p95 {model_stats['max_p95_ms']:.0f} ms, "
+                      f"{model_stats['hedged']} hedged ({model_stats['hedge_wins']} won), {model_stats['escalations']} escalated")
+    finally:
+        store.stop()
+
+    report = {'config': {k: v for k, v in vars(args).items() if k not in ('json_out', 'baseline')}, 'results': results}
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to: {args.json_out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("🔴 Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("✅ No regressions against baseline.")
+    return 0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the extraction pipeline against a local mock bookstore")
+    parser.add_argument("--pages", type=int, default=200, help="Product pages in the generated catalogue")
+    parser.add_argument("--mode", choices=MODES.keys(), default='template', help="Which extraction tiers to exercise")
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(',')], default=[1, 4, 16],
+                        help="Comma-separated concurrency levels")
+    parser.add_argument("--server-latency", type=float, default=0.02, help="Seconds the mock server waits per response")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds the fake LLM waits per call")
+    parser.add_argument("--llm-tail-rate", type=float, default=0.0, help="Share of fake LLM calls that take ten times as long")
+    parser.add_argument("--models", type=parse_models,
+                        help="Route across fake models, cheapest first, as name:latency[:failure_rate],... (overrides --llm-latency)")
+    parser.add_argument("--no-hedge", action="store_true", help="With --models, never hedge slow calls")
+    parser.add_argument("--description-words", type=int, default=150, help="Words per generated description")
+    parser.add_argument("--category-links", type=int, default=50, help="Sidebar links per page (boilerplate size)")
+    parser.add_argument("--browsers", type=int, default=1, help="Pooled browsers in browser mode")
+    parser.add_argument("--ready-timeout", type=float, default=6.0, help="Page-readiness ceiling in browser mode")
+    parser.add_argument("--llm-batch", type=int, default=1, help="Pages per batched LLM call in llm mode (1 = one call per page)")
+    parser.add_argument("--seed", type=int, default=7, help="Catalogue generator seed")
+    parser.add_argument("--json-out", type=str, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=str, help="Earlier --json-out report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed relative slowdown before flagging a regression")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    sys.exit(asyncio.run(main(parse_args())))
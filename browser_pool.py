@@ -0,0 +1,216 @@
+from contextlib import asynccontextmanager, nullcontext
+import asyncio
+import socket
+
+from playwright.async_api import async_playwright
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class PooledBrowser:
+
+    def __init__(self, browser, cdp_url):
+        self.browser = browser
+        self.cdp_url = cdp_url
+        self.active = 0
+        self.pages_served = 0
+        self.retiring = False
+        # Exclusive leases holding or waiting for the browser, and how many
+        # of them are still queued on `lock`.
+        self.draining = 0
+        self.waiting = 0
+        self.lock = asyncio.Lock()
+
+    def healthy(self):
+        return self.browser.is_connected() and not self.retiring and not self.draining
+
+
+class BrowserPool:
+    # Keeps a few long-lived Chromium processes and hands out isolated
+    # contexts. A browser is retired once it has served `recycle_after`
+    # contexts (or drops its connection) and is replaced when it goes idle.
+    # Every browser also listens on a local CDP port, so a lease can hand
+    # the whole browser to a CDP client such as browser_use (`exclusive`).
+
+    def __init__(self, size=1, max_contexts_per_browser=4, recycle_after=200,
+                 headless=True, args=None, context_options=None, context_hooks=None, tracer=None):
+        self.size = size
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.recycle_after = recycle_after
+        self.headless = headless
+        self.args = args or []
+        self.context_options = context_options or {}
+        # Async callables run on every new context, e.g. request interception.
+        self.context_hooks = list(context_hooks or [])
+        self.tracer = tracer
+        self.browsers = []
+        self.launched = 0
+        self.recycled = 0
+        self.launch_failures = 0
+        self._playwright = None
+        self._leases = {}
+        self._cond = asyncio.Condition()
+
+    @classmethod
+    def from_browser_config(cls, browser_config, **kwargs):
+        context_options = {}
+        video = browser_config.get('record_video')
+        if video:
+            context_options['record_video_dir'] = video['dir']
+            context_options['record_video_size'] = video['size']
+        return cls(
+            headless=browser_config.get('headless', True),
+            args=browser_config.get('args'),
+            context_options=context_options,
+            **kwargs
+        )
+
+    async def start(self):
+        # Browsers are launched on the first lease, so runs that never need
+        # one (template or cache hits only) never start Chromium.
+        return self
+
+    async def _fill(self):
+        # Launches browsers until the pool is full again. A failed launch
+        # only raises when the pool has no browser at all; otherwise the
+        # pool runs smaller and tries again on the next checkout.
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        while len(self.browsers) < self.size:
+            try:
+                self.browsers.append(await self._launch())
+            except Exception:
+                self.launch_failures += 1
+                if not self.browsers:
+                    raise
+                break
+
+    async def close(self):
+        for pooled in self.browsers:
+            await self._close_browser(pooled)
+        self.browsers.clear()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _span(self, name):
+        return self.tracer.span(name) if self.tracer is not None else nullcontext()
+
+    async def _launch(self):
+        port = _free_port()
+        with self._span('browser_launch'):
+            browser = await self._playwright.chromium.launch(
+                headless=self.headless,
+                args=[*self.args, f'--remote-debugging-port={port}']
+            )
+        self.launched += 1
+        return PooledBrowser(browser, f'http://127.0.0.1:{port}')
+
+    async def _close_browser(self, pooled):
+        try:
+            await pooled.browser.close()
+        except Exception:
+            pass
+
+    async def _retire(self, pooled):
+        # The next checkout launches the replacement.
+        self.browsers.remove(pooled)
+        await self._close_browser(pooled)
+        self.recycled += 1
+
+    async def _checkout(self):
+        async with self._cond:
+            while True:
+                for pooled in list(self.browsers):
+                    if not pooled.browser.is_connected() and pooled.active == 0:
+                        await self._retire(pooled)
+                await self._fill()
+                candidates = [
+                    pooled for pooled in self.browsers
+                    if pooled.healthy() and pooled.active < self.max_contexts_per_browser
+                ]
+                if candidates:
+                    pooled = min(candidates, key=lambda p: p.active)
+                    pooled.active += 1
+                    return pooled
+                await self._cond.wait()
+
+    async def _checkin(self, pooled):
+        async with self._cond:
+            pooled.active -= 1
+            pooled.pages_served += 1
+            if pooled.pages_served >= self.recycle_after:
+                pooled.retiring = True
+            if (pooled.retiring or not pooled.browser.is_connected()) and pooled.active == 0:
+                await self._retire(pooled)
+            self._cond.notify_all()
+
+    @asynccontextmanager
+    async def context(self, record_video=True, **options):
+        options = {**self.context_options, **options}
+        if not record_video:
+            options.pop('record_video_dir', None)
+            options.pop('record_video_size', None)
+        with self._span('browser_lease'):
+            pooled = await self._checkout()
+        context = None
+        try:
+            with self._span('context_setup'):
+                context = await pooled.browser.new_context(**options)
+                self._leases[context] = pooled
+                for hook in self.context_hooks:
+                    await hook(context)
+            yield context
+        finally:
+            if context is not None:
+                self._leases.pop(context, None)
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+            await self._checkin(pooled)
+
+    @asynccontextmanager
+    async def exclusive(self, context):
+        # Hands the whole browser behind a leased context to the caller and
+        # yields its CDP URL. New leases go to other browsers meanwhile, and
+        # the caller waits until the browser's other leases have closed or
+        # are queued here themselves, so nothing else runs in it.
+        pooled = self._leases[context]
+        async with self._cond:
+            pooled.draining += 1
+            pooled.waiting += 1
+            self._cond.notify_all()
+        queued = True
+        try:
+            async with pooled.lock:
+                async with self._cond:
+                    pooled.waiting -= 1
+                    queued = False
+                    await self._cond.wait_for(lambda: pooled.active - pooled.waiting <= 1)
+                yield pooled.cdp_url
+        finally:
+            async with self._cond:
+                if queued:
+                    pooled.waiting -= 1
+                pooled.draining -= 1
+                self._cond.notify_all()
+
+    def stats(self):
+        return {
+            'browsers': len(self.browsers),
+            'active_contexts': sum(p.active for p in self.browsers),
+            'launched': self.launched,
+            'recycled': self.recycled,
+            'launch_failures': self.launch_failures,
+        }
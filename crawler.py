@@ -0,0 +1,187 @@
+from urllib.parse import urljoin, urlsplit
+import asyncio
+import hashlib
+import math
+import os
+import sqlite3
+
+from bs4 import BeautifulSoup
+
+from result_cache import normalize_url
+from site_templates import find_template
+
+
+class BloomFilter:
+
+    def __init__(self, capacity=1_000_000, error_rate=0.001):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.sha256(item.encode('utf-8')).digest()
+        a = int.from_bytes(digest[:8], 'big')
+        b = int.from_bytes(digest[8:16], 'big') | 1
+        return [(a + i * b) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        # Returns True if the item was (probably) not seen before.
+        new = False
+        for pos in self._positions(item):
+            byte, bit = divmod(pos, 8)
+            if not self.bits[byte] & (1 << bit):
+                self.bits[byte] |= 1 << bit
+                new = True
+        return new
+
+
+class MemoryFrontier:
+    # Seen-set for a single run; a Bloom filter keeps memory flat on large
+    # sites at the cost of rarely skipping a URL that was never visited.
+
+    def __init__(self, capacity=1_000_000):
+        self.seen = BloomFilter(capacity)
+
+    def add(self, url, kind):
+        return self.seen.add(url)
+
+    def mark_done(self, url):
+        pass
+
+    def pending(self, kind):
+        return []
+
+    def close(self):
+        pass
+
+
+class SqliteFrontier:
+    # Persistent frontier. Listing pages stay pending until they have been
+    # fetched, so an interrupted crawl picks up where it stopped; product
+    # pages are re-offered on restart and the result sink filters out the
+    # ones that were already extracted.
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS frontier ("
+            " url TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " done INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.commit()
+
+    def add(self, url, kind):
+        cursor = self._db.execute("INSERT OR IGNORE INTO frontier (url, kind) VALUES (?, ?)", (url, kind))
+        self._db.commit()
+        return cursor.rowcount == 1
+
+    def mark_done(self, url):
+        self._db.execute("UPDATE frontier SET done = 1 WHERE url = ?", (url,))
+        self._db.commit()
+
+    def pending(self, kind):
+        rows = self._db.execute("SELECT url FROM frontier WHERE kind = ? AND done = 0", (kind,))
+        return [row[0] for row in rows]
+
+    def close(self):
+        self._db.close()
+
+
+def discover_links(url, html):
+    template = find_template(url)
+    if template is None or not template.get('links'):
+        return [], []
+    soup = BeautifulSoup(html, 'html.parser')
+    host = urlsplit(url).hostname
+
+    def collect(selectors):
+        found = []
+        for selector in selectors:
+            for a in soup.select(selector):
+                href = a.get('href')
+                if not href:
+                    continue
+                link = normalize_url(urljoin(url, href))
+                if urlsplit(link).hostname == host:
+                    found.append(link)
+        return found
+
+    links = template['links']
+    return collect(links.get('product', [])), collect(links.get('listing', []))
+
+
+class Crawler:
+    # Follows listing pages with plain HTTP and yields product page URLs as
+    # they are discovered. No browser or LLM is involved.
+
+    def __init__(self, start_urls, fetch, frontier=None, concurrency=4, max_listing_pages=None):
+        self.start_urls = [normalize_url(url) for url in start_urls]
+        self.fetch = fetch
+        self.frontier = frontier or MemoryFrontier()
+        self.concurrency = concurrency
+        self.max_listing_pages = max_listing_pages
+        self.listing_pages = 0
+        self.products_found = 0
+
+    async def product_urls(self):
+        listings = asyncio.Queue()
+        products = asyncio.Queue()
+
+        for url in self.frontier.pending('product'):
+            products.put_nowait(url)
+        for url in self.frontier.pending('listing'):
+            listings.put_nowait(url)
+        for url in self.start_urls:
+            if self.frontier.add(url, 'listing'):
+                listings.put_nowait(url)
+
+        async def worker():
+            while True:
+                url = await listings.get()
+                try:
+                    if self.max_listing_pages is None or self.listing_pages < self.max_listing_pages:
+                        self.listing_pages += 1
+                        await self.visit(url, listings, products)
+                except Exception as e:
+                    # Fetch failures already come back as None, so this is
+                    # e.g. the frontier failing; stop the crawl with it.
+                    products.put_nowait(e)
+                finally:
+                    listings.task_done()
+
+        async def finish():
+            await listings.join()
+            await products.put(None)
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        finisher = asyncio.create_task(finish())
+        try:
+            while True:
+                url = await products.get()
+                if url is None:
+                    break
+                if isinstance(url, Exception):
+                    raise url
+                yield url
+        finally:
+            finisher.cancel()
+            for task in workers:
+                task.cancel()
+
+    async def visit(self, url, listings, products):
+        html = await self.fetch(url)
+        if html is None:
+            return
+        product_links, listing_links = discover_links(url, html)
+        for link in product_links:
+            if self.frontier.add(link, 'product'):
+                self.products_found += 1
+                products.put_nowait(link)
+        for link in listing_links:
+            if self.frontier.add(link, 'listing'):
+                listings.put_nowait(link)
+        self.frontier.mark_done(url)
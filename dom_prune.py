@@ -0,0 +1,166 @@
+import re
+
+from bs4 import BeautifulSoup
+
+from result_cache import content_hash
+from site_templates import find_template
+
+
+NOISE_TAGS = ['script', 'style', 'noscript', 'template', 'svg']
+
+# Page chrome, dropped when the page has no recognisable content region.
+# Inside a region only INNER_NOISE_TAGS and INNER_BOILERPLATE go: a header or
+# form there usually holds the title, price or stock.
+PAGE_CHROME_TAGS = ['nav', 'header', 'footer', 'aside', 'iframe']
+INNER_NOISE_TAGS = ['nav', 'aside', 'iframe']
+
+BOILERPLATE = re.compile(
+    r'(^|[-_ ])(nav|navbar|menu|sidebar|side_categories|footer|header|breadcrumbs?|cookie|banner|'
+    r'advert|ads|promo|social|share|related|recommend)([-_ ]|$)',
+    re.IGNORECASE
+)
+INNER_BOILERPLATE = re.compile(
+    r'(^|[-_ ])(breadcrumbs?|cookie|advert|ads|social|share|related|recommend)([-_ ]|$)',
+    re.IGNORECASE
+)
+
+MAIN_CANDIDATES = ['main', '[role=main]', 'article', '#content', '.content']
+
+
+def estimate_tokens(text):
+    # Rough count for budgeting and reporting; ~4 characters per token.
+    return (len(text) + 3) // 4
+
+
+def main_selector(url):
+    template = find_template(url)
+    return template.get('main') if template else None
+
+
+def _matches(pattern):
+    def match(tag):
+        if tag.attrs is None:
+            return False
+        names = ' '.join(tag.get('class', []) + [tag.get('id', '')])
+        return bool(names.strip()) and bool(pattern.search(names))
+    return match
+
+
+def _remove(tags, keep=None):
+    # Decomposes the tags, except ones that contain `keep`.
+    for tag in list(tags):
+        if tag.decomposed or (keep is not None and keep in tag.descendants):
+            continue
+        tag.decompose()
+
+
+def clean_soup(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(NOISE_TAGS):
+        tag.decompose()
+    return soup
+
+
+def find_region(url, soup):
+    # The site's configured selector, else the first main-like element that
+    # holds a real amount of text; None when the page has neither.
+    selector = main_selector(url)
+    if selector:
+        region = soup.select_one(selector)
+        if region is not None:
+            return region
+    for candidate in MAIN_CANDIDATES:
+        region = soup.select_one(candidate)
+        if region is not None and len(region.get_text(strip=True)) > 200:
+            return region
+    return None
+
+
+def prune_html(url, html):
+    # Reduces a page to its main-content region, chosen before anything is
+    # removed. Inside the region only navigation, sidebars and third-party
+    # blocks go. Without a region the page chrome around the content is
+    # dropped instead, keeping whatever holds the page's h1.
+    soup = clean_soup(html)
+    region = find_region(url, soup)
+    if region is not None:
+        _remove(region(INNER_NOISE_TAGS))
+        _remove(region.find_all(_matches(INNER_BOILERPLATE)))
+        return region
+
+    body = soup.body or soup
+    title = body.find('h1')
+    _remove(body(PAGE_CHROME_TAGS), keep=title)
+    _remove(body.find_all(_matches(BOILERPLATE)), keep=title)
+    return body
+
+
+def main_text(url, html, limit=20_000):
+    # Returns (text, stats) with the estimated token count of the whole page
+    # and of what is left after pruning.
+    before = clean_soup(html)
+    full_text = (before.body or before).get_text('\n', strip=True)
+    text = prune_html(url, html).get_text('\n', strip=True)[:limit]
+    return text, {'tokens_before': estimate_tokens(full_text), 'tokens_after': estimate_tokens(text)}
+
+
+def content_fingerprint(url, html):
+    # Hash of the text that holds the extracted fields. With a site template
+    # that is its main region, so a new banner or sidebar elsewhere does not
+    # count as a change. Without one the generic region is only a guess, so
+    # the whole visible text counts; scripts and styles (tracking tokens,
+    # nonces) never do.
+    soup = clean_soup(html)
+    region = soup.select_one(main_selector(url)) if main_selector(url) else None
+    if region is None:
+        region = soup.body or soup
+    return content_hash(region.get_text('\n', strip=True))
+
+
+# Live-DOM version of prune_html, run in the page before the agent reads it so
+# its DOM serialization and screenshots only cover the main content.
+_PRUNE_JS = """
+([selector, candidates, chromeTags, innerTags, pattern, innerPattern]) => {
+    const textLength = () => (document.body ? document.body.innerText.length : 0);
+    const before = textLength();
+    const matching = (root, source) => {
+        const re = new RegExp(source, 'i');
+        return Array.from(root.querySelectorAll('[class], [id]')).filter(el => {
+            const names = (typeof el.className === 'string' ? el.className : '') + ' ' + el.id;
+            return names.trim() && re.test(names);
+        });
+    };
+    let region = selector ? document.querySelector(selector) : null;
+    for (const candidate of candidates) {
+        if (region) break;
+        const el = document.querySelector(candidate);
+        if (el && el.innerText.trim().length > 200) region = el;
+    }
+    if (region) {
+        let node = region;
+        while (node && node !== document.body) {
+            for (const sibling of Array.from(node.parentElement ? node.parentElement.children : [])) {
+                if (sibling !== node && !['SCRIPT', 'STYLE'].includes(sibling.tagName)) sibling.remove();
+            }
+            node = node.parentElement;
+        }
+        region.querySelectorAll(innerTags.join(',')).forEach(el => el.remove());
+        matching(region, innerPattern).forEach(el => el.remove());
+    } else if (document.body) {
+        const title = document.querySelector('h1');
+        const chrome = Array.from(document.body.querySelectorAll(chromeTags.join(',')));
+        for (const el of chrome.concat(matching(document.body, pattern))) {
+            if (!(title && el.contains(title))) el.remove();
+        }
+    }
+    return [before, textLength()];
+}
+"""
+
+
+async def prune_page(page, url):
+    before, after = await page.evaluate(_PRUNE_JS, [
+        main_selector(url), MAIN_CANDIDATES, PAGE_CHROME_TAGS, INNER_NOISE_TAGS,
+        BOILERPLATE.pattern, INNER_BOILERPLATE.pattern
+    ])
+    return {'tokens_before': (before + 3) // 4, 'tokens_after': (after + 3) // 4}
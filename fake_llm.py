@@ -0,0 +1,112 @@
+import asyncio
+import json
+import random
+import re
+
+from browser_use.llm.exceptions import ModelProviderError
+from browser_use.llm.views import ChatInvokeCompletion, ChatInvokeUsage
+
+
+# A generated books.toscrape.com-style catalogue and a fake chat model that
+# answers from it, shared by the benchmark and the tests. Nothing here
+# touches the network or the platform.
+
+WORDS = ("poetry drawings humorous creative verse readers classic collection edition rhythm "
+         "laugh smile story journey garden winter letters ocean memory river").split()
+
+
+def make_catalogue(size, description_words, seed=7):
+    rng = random.Random(seed)
+    books = {}
+    for i in range(size):
+        path = f"/catalogue/book-{i}_{1000 + i}/index.html"
+        books[path] = {
+            'title': f"Benchmark Book {i}",
+            'rating': rng.randint(1, 5),
+            'price': round(rng.uniform(10, 60), 2),
+            'description': " ".join(rng.choice(WORDS) for _ in range(description_words)),
+            'availability': f"In stock ({rng.randint(1, 30)} available)",
+        }
+    return books
+
+
+
+class FakeLLM:
+    # Deterministic stand-in for ChatGoogle. It answers from the catalogue
+    # for whichever product URL appears in the prompt, after an injectable
+    # delay, and reports token usage estimated from the prompt size. A
+    # seeded share of calls can fail like a response that broke the output
+    # schema (`failure_rate`) or take ten times as long (`tail_rate`).
+
+    def __init__(self, books, latency=0.0, model='fake-llm', failure_rate=0.0, tail_rate=0.0, seed=7):
+        self.books = books
+        self.latency = latency
+        self.model = model
+        self.failure_rate = failure_rate
+        self.tail_rate = tail_rate
+        self.rng = random.Random(f"{seed}-{model}")
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    @property
+    def provider(self):
+        return 'fake'
+
+    @property
+    def name(self):
+        return self.model
+
+    @property
+    def model_name(self):
+        return self.model
+
+    def _books_for(self, prompt):
+        books = [self.books[path] for path in re.findall(r'/catalogue/[^\s"\'<>\\)]+/index\.html', prompt)
+                 if path in self.books]
+        if not books:
+            raise ValueError("fake LLM: no known product URL in prompt")
+        return books
+
+    async def ainvoke(self, messages, output_format=None, **kwargs):
+        prompt = json.dumps([m.model_dump(mode='json') for m in messages], ensure_ascii=False)
+        slow = self.rng.random() < self.tail_rate
+        failed = self.rng.random() < self.failure_rate
+        if self.latency:
+            await asyncio.sleep(self.latency * (10 if slow else 1))
+        if failed:
+            raise ModelProviderError("fake LLM: response did not match the output schema", model=self.model)
+        books = self._books_for(prompt)
+        book = books[0]
+
+        if output_format is None:
+            completion = json.dumps(book)
+        elif 'action' in output_format.model_fields:
+            # Agent step: finish immediately with the structured result.
+            completion = output_format.model_validate({
+                'evaluation_previous_goal': 'Page is open.',
+                'memory': 'Extracted the product fields.',
+                'next_goal': 'Return the result.',
+                'action': [{'done': {'success': True, 'data': book}}],
+            })
+        elif 'records' in output_format.model_fields:
+            # Batched extraction: one record per product page, in prompt order.
+            book = {'records': [{'item': item, **book} for item, book in enumerate(books)]}
+            completion = output_format.model_validate(book)
+        else:
+            completion = output_format.model_validate(book)
+
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(json.dumps(book)) // 4
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        usage = ChatInvokeUsage(
+            prompt_tokens=prompt_tokens,
+            prompt_cached_tokens=None,
+            prompt_cache_creation_tokens=None,
+            prompt_image_tokens=None,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens
+        )
+        return ChatInvokeCompletion(completion=completion, usage=usage)
@@ -0,0 +1,120 @@
+from bs4 import BeautifulSoup
+import httpx
+
+from rate_limit import DomainScheduler, RobotsDisallowed
+
+try:
+    import h2  # noqa: F401
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+
+# Markers of an empty client-side app shell whose content only exists after
+# JavaScript runs.
+JS_SHELL_HINTS = (
+    'enable javascript',
+    'requires javascript',
+    'javascript is required',
+    '<div id="root"></div>',
+    '<div id="app"></div>',
+)
+
+
+class FetchResult:
+
+    def __init__(self, url, status, html, headers):
+        self.url = url
+        self.status = status
+        self.html = html
+        self.headers = headers
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+
+class HttpFetcher:
+    # One shared keep-alive client for the whole run (HTTP/2 when the h2
+    # package is installed). Every request goes through the per-domain
+    # scheduler, and 429/503 responses are retried after its backoff.
+
+    def __init__(self, scheduler=None, max_connections=100, timeout=15.0, user_agent=None, max_retries=3):
+        headers = {'User-Agent': user_agent} if user_agent else None
+        self.client = httpx.AsyncClient(
+            http2=HTTP2,
+            follow_redirects=True,
+            timeout=timeout,
+            headers=headers,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        self.scheduler = scheduler or DomainScheduler(qps=None)
+        self.max_retries = max_retries
+        self.requests = 0
+        self.errors = 0
+        self.robots_blocked = 0
+
+    async def check_robots(self, url):
+        # Raises RobotsDisallowed when robots.txt rules the URL out. Every
+        # tier checks this before it loads the URL, the browser included.
+        await self.scheduler.load_robots(url, self._fetch_robots)
+        if not self.scheduler.allowed(url):
+            self.robots_blocked += 1
+            raise RobotsDisallowed(f"{url} is disallowed by robots.txt")
+
+    async def fetch(self, url, headers=None):
+        # Returns None when the request itself fails; a URL robots.txt
+        # disallows raises RobotsDisallowed instead.
+        await self.check_robots(url)
+        for _ in range(self.max_retries + 1):
+            async with self.scheduler.slot(url):
+                self.requests += 1
+                try:
+                    response = await self.client.get(url, headers=headers)
+                except httpx.HTTPError:
+                    self.errors += 1
+                    return None
+            backoff = self.scheduler.record_response(url, response.status_code, response.headers)
+            if backoff is None:
+                break
+        return FetchResult(str(response.url), response.status_code, response.text, response.headers)
+
+    async def _fetch_robots(self, url):
+        try:
+            response = await self.client.get(url)
+        except httpx.HTTPError:
+            return None
+        return response.text if response.status_code == 200 else None
+
+    async def fetch_html(self, url):
+        try:
+            result = await self.fetch(url)
+        except RobotsDisallowed:
+            return None
+        if result is None or not result.ok:
+            return None
+        return result.html
+
+    async def close(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+def needs_javascript(html, min_text_length=200):
+    # True when the static HTML is unlikely to hold the page content, so the
+    # URL has to be rendered in a browser. The hints are matched after
+    # scripts and <noscript> banners are removed: plenty of static pages
+    # carry a "please enable JavaScript" notice for script-less visitors.
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(['script', 'style', 'noscript', 'template']):
+        tag.decompose()
+    lowered = str(soup).lower()
+    if any(hint in lowered for hint in JS_SHELL_HINTS):
+        return True
+    body = soup.body or soup
+    return len(body.get_text(' ', strip=True)) < min_text_length
@@ -0,0 +1,186 @@
+import hashlib
+import json
+import os
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+import zlib
+
+
+FRAME_HEADER = struct.Struct('>I')
+
+
+class HistoryStore:
+    # Compact storage for agent histories. Each step is its own zlib
+    # compressed frame appended to a segment file (one segment per writing
+    # process, rolled over at `segment_bytes`), and an SQLite index holds
+    # every frame's offset plus a per-run summary with the final result.
+    # Screenshots are stored once per distinct image under screenshots/,
+    # named by content hash, and steps only keep the hash.
+    #
+    # Reading never loads a whole run: `final_result` comes from the index,
+    # and `steps` decompresses one frame at a time.
+
+    def __init__(self, directory='history', segment_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.screenshot_dir = os.path.join(directory, 'screenshots')
+        os.makedirs(self.screenshot_dir, exist_ok=True)
+        self.bytes_written = 0
+        self.screenshots_stored = 0
+        self.screenshots_deduped = 0
+        self._lock = threading.Lock()
+        self._segment = None
+        self._segment_name = None
+        self._segment_index = 0
+        self._db = sqlite3.connect(os.path.join(directory, 'index.sqlite'), timeout=30, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id TEXT PRIMARY KEY,"
+            " url TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " steps INTEGER NOT NULL,"
+            " success INTEGER,"
+            " final_result TEXT)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS steps ("
+            " run_id TEXT NOT NULL,"
+            " step INTEGER NOT NULL,"
+            " segment TEXT NOT NULL,"
+            " offset INTEGER NOT NULL,"
+            " length INTEGER NOT NULL,"
+            " PRIMARY KEY (run_id, step))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS runs_created ON runs (created)")
+        self._db.commit()
+
+    def _open_segment(self):
+        if self._segment is not None and self._segment.tell() < self.segment_bytes:
+            return
+        if self._segment is not None:
+            self._segment.close()
+        self._segment_index += 1
+        self._segment_name = f"{int(time.time())}-{os.getpid()}-{self._segment_index}.log"
+        self._segment = open(os.path.join(self.directory, self._segment_name), 'ab')
+
+    def _store_screenshot(self, path):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        digest = hashlib.sha256(data).hexdigest()
+        target = os.path.join(self.screenshot_dir, digest[:2], digest + os.path.splitext(path)[1])
+        if os.path.exists(target):
+            with self._lock:
+                self.screenshots_deduped += 1
+            return os.path.basename(target)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Threads and worker processes may store the same image at once, so
+        # each writes its own temp file; whichever replace lands last wins,
+        # and the content is the same either way.
+        temp = f"{target}.{os.getpid()}-{uuid.uuid4().hex[:8]}.tmp"
+        with open(temp, 'wb') as f:
+            f.write(data)
+        try:
+            os.replace(temp, target)
+        except OSError:
+            # Windows refuses to replace a file another writer has open.
+            os.remove(temp)
+            if not os.path.exists(target):
+                raise
+        with self._lock:
+            self.screenshots_stored += 1
+        return os.path.basename(target)
+
+    def _frame(self, step):
+        state = step['state']
+        screenshot = state.pop('screenshot_path', None)
+        state['screenshot'] = self._store_screenshot(screenshot) if screenshot else None
+        payload = zlib.compress(json.dumps(step, ensure_ascii=False, default=str).encode('utf-8'), 6)
+        return FRAME_HEADER.pack(len(payload)) + payload
+
+    def write(self, url, history):
+        # Stores a browser_use AgentHistoryList and returns its run id. Safe
+        # to call from a worker thread.
+        run_id = uuid.uuid4().hex[:12]
+        frames = [self._frame(item.model_dump()) for item in history.history]
+        final_result = history.final_result()
+        with self._lock:
+            self._open_segment()
+            rows = []
+            for step, frame in enumerate(frames):
+                rows.append((run_id, step, self._segment_name, self._segment.tell(), len(frame)))
+                self._segment.write(frame)
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+            self.bytes_written += sum(len(frame) for frame in frames)
+            self._db.executemany("INSERT INTO steps (run_id, step, segment, offset, length) VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.execute(
+                "INSERT INTO runs (run_id, url, created, steps, success, final_result) VALUES (?, ?, ?, ?, ?, ?)",
+                (run_id, url, time.time(), len(frames), history.is_successful(), final_result)
+            )
+            self._db.commit()
+        return run_id
+
+    def runs(self, url=None, since=None):
+        # Run summaries, newest first, without touching the segments.
+        query = "SELECT run_id, url, created, steps, success FROM runs WHERE 1 = 1"
+        params = []
+        if url is not None:
+            query += " AND url = ?"
+            params.append(url)
+        if since is not None:
+            query += " AND created >= ?"
+            params.append(since)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY created DESC", params).fetchall()
+        for run_id, run_url, created, steps, success in rows:
+            yield {'run_id': run_id, 'url': run_url, 'created': created, 'steps': steps,
+                   'success': None if success is None else bool(success)}
+
+    def final_result(self, run_id):
+        with self._lock:
+            row = self._db.execute("SELECT final_result FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def steps(self, run_id):
+        # Yields the run's steps one at a time, each decompressed on demand.
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT segment, offset, length FROM steps WHERE run_id = ? ORDER BY step", (run_id,)
+            ).fetchall()
+        handles = {}
+        try:
+            for segment, offset, length in rows:
+                if segment not in handles:
+                    handles[segment] = open(os.path.join(self.directory, segment), 'rb')
+                f = handles[segment]
+                f.seek(offset)
+                frame = f.read(length)
+                (size,) = FRAME_HEADER.unpack_from(frame)
+                yield json.loads(zlib.decompress(frame[FRAME_HEADER.size:FRAME_HEADER.size + size]))
+        finally:
+            for f in handles.values():
+                f.close()
+
+    def screenshot_path(self, name):
+        return os.path.join(self.screenshot_dir, name[:2], name)
+
+    def stats(self):
+        return {
+            'bytes_written': self.bytes_written,
+            'screenshots_stored': self.screenshots_stored,
+            'screenshots_deduped': self.screenshots_deduped,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+            self._db.close()
@@ -0,0 +1,112 @@
+from collections import Counter
+from urllib.parse import urlparse
+
+
+RESOURCE_TYPES = ('image', 'media', 'font', 'stylesheet', 'script', 'xhr', 'fetch', 'websocket', 'other')
+
+DEFAULT_DENY_DOMAINS = (
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'facebook.net',
+    'hotjar.com',
+)
+
+# Typical transfer sizes, used to estimate what an aborted request would
+# have cost since its response is never seen.
+TYPICAL_BYTES = {
+    'image': 40_000,
+    'media': 500_000,
+    'font': 30_000,
+    'stylesheet': 20_000,
+    'script': 25_000,
+}
+DEFAULT_TYPICAL_BYTES = 5_000
+
+
+def _matches(host, domains):
+    return any(host == d or host.endswith('.' + d) for d in domains)
+
+
+class RequestFilter:
+    # Routes every request of a browser context through a block list by
+    # resource type and domain. Documents are never blocked so the page
+    # being extracted always loads.
+
+    def __init__(self, block_types=(), allow_domains=None, deny_domains=DEFAULT_DENY_DOMAINS,
+                 max_response_bytes=None):
+        self.block_types = set(block_types)
+        self.allow_domains = tuple(allow_domains or ())
+        self.deny_domains = tuple(deny_domains or ())
+        self.max_response_bytes = max_response_bytes
+        self.allowed = 0
+        self.failed = 0
+        self.blocked = Counter()
+        # An estimate: aborted requests count TYPICAL_BYTES for their type.
+        self.approx_bytes_saved = 0
+
+    @property
+    def active(self):
+        return bool(self.block_types or self.allow_domains or self.deny_domains or self.max_response_bytes)
+
+    async def attach(self, context):
+        if self.active:
+            await context.route('**/*', self._handle)
+
+    def block_reason(self, request):
+        if request.resource_type == 'document' and request.is_navigation_request():
+            return None
+        host = (urlparse(request.url).hostname or '').lower()
+        if self.allow_domains and not _matches(host, self.allow_domains):
+            return 'domain'
+        if _matches(host, self.deny_domains):
+            return 'domain'
+        if request.resource_type in self.block_types:
+            return request.resource_type
+        return None
+
+    async def _handle(self, route):
+        request = route.request
+        reason = self.block_reason(request)
+        if reason is not None:
+            self.blocked[reason] += 1
+            self.approx_bytes_saved += TYPICAL_BYTES.get(request.resource_type, DEFAULT_TYPICAL_BYTES)
+            await route.abort('blockedbyclient')
+            return
+
+        if self.max_response_bytes is None or request.resource_type == 'document':
+            self.allowed += 1
+            await route.continue_()
+            return
+
+        # The size cap keeps oversized responses out of the renderer. A
+        # declared Content-Length is checked before the body is read; other
+        # responses are measured once they have been transferred.
+        try:
+            response = await route.fetch()
+            length = response.headers.get('content-length', '')
+            if length.isdigit() and int(length) > self.max_response_bytes:
+                await response.dispose()
+                body = None
+            else:
+                body = await response.body()
+        except Exception:
+            # The fetch failed (connection reset, timeout, context closed):
+            # fail the request instead of leaving the page waiting on it.
+            self.failed += 1
+            await route.abort('failed')
+            return
+        if body is None or len(body) > self.max_response_bytes:
+            self.blocked['oversized'] += 1
+            await route.abort('blockedbyclient')
+            return
+        self.allowed += 1
+        await route.fulfill(response=response, body=body)
+
+    def stats(self):
+        return {
+            'allowed': self.allowed,
+            'failed': self.failed,
+            'blocked': dict(self.blocked),
+            'approx_bytes_saved': self.approx_bytes_saved,
+        }
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from result_cache import normalize_url
+
+
+PENDING, LEASED, DONE, DEAD = 'pending', 'leased', 'done', 'dead'
+
+
+class JobQueue:
+    # Durable work queue in a SQLite file that any number of extraction
+    # processes on one host can consume. WAL mode needs shared memory, so
+    # the file must not live on a network filesystem.
+    #
+    # A lease hides a job from other consumers for `visibility_timeout`
+    # seconds; a consumer that crashes simply lets the lease run out and the
+    # job is handed to someone else. Failed jobs are retried with backoff
+    # until `max_attempts`, then parked in the dead-letter state. Results are
+    # stored with the job and the first completion wins, so a job finished
+    # twice (an expired lease that still completed) is only written once.
+
+    def __init__(self, path, visibility_timeout=600.0, max_attempts=3, retry_backoff=30.0, consumer=None):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.consumer = consumer or f"{socket.gethostname()}:{os.getpid()}"
+        # Calls come from the event loop's worker threads; the lock keeps
+        # one transaction on the connection at a time.
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " key TEXT PRIMARY KEY,"
+            " url TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " available_at REAL NOT NULL,"
+            " lease_token TEXT,"
+            " leased_by TEXT,"
+            " last_error TEXT,"
+            " result TEXT,"
+            " updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (state, available_at)")
+
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two consumers
+        # can never lease the same row.
+        self._db.execute("BEGIN IMMEDIATE")
+        return self._db
+
+    def enqueue(self, urls):
+        # Returns how many URLs were new. Jobs already queued, finished or
+        # dead are left alone, so re-submitting a list is harmless.
+        with self._lock:
+            now = time.time()
+            added = 0
+            db = self._transaction()
+            try:
+                for url in urls:
+                    cursor = db.execute(
+                        "INSERT OR IGNORE INTO jobs (key, url, state, available_at, updated) VALUES (?, ?, ?, ?, ?)",
+                        (normalize_url(url), url, PENDING, now, now)
+                    )
+                    added += cursor.rowcount
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            return added
+
+    def lease(self, limit=1):
+        # Returns up to `limit` (url, token) pairs. Expired leases count as
+        # available again; ones that have used up their attempts go to the
+        # dead-letter state instead.
+        with self._lock:
+            now = time.time()
+            db = self._transaction()
+            try:
+                db.execute(
+                    "UPDATE jobs SET state = ?, last_error = COALESCE(last_error, 'lease expired'), updated = ?"
+                    " WHERE state = ? AND available_at <= ? AND attempts >= ?",
+                    (DEAD, now, LEASED, now, self.max_attempts)
+                )
+                rows = db.execute(
+                    "SELECT key, url FROM jobs WHERE state IN (?, ?) AND available_at <= ?"
+                    " ORDER BY available_at LIMIT ?",
+                    (PENDING, LEASED, now, limit)
+                ).fetchall()
+                leases = []
+                for key, url in rows:
+                    token = uuid.uuid4().hex
+                    db.execute(
+                        "UPDATE jobs SET state = ?, attempts = attempts + 1, available_at = ?,"
+                        " lease_token = ?, leased_by = ?, updated = ? WHERE key = ?",
+                        (LEASED, now + self.visibility_timeout, token, self.consumer, now, key)
+                    )
+                    leases.append((url, token))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            return leases
+
+    def extend(self, url, token):
+        # Pushes the lease deadline out again for a job that is still being
+        # worked on. Returns False when the lease was lost to another consumer.
+        with self._lock:
+            now = time.time()
+            cursor = self._db.execute(
+                "UPDATE jobs SET available_at = ?, updated = ? WHERE key = ? AND state = ? AND lease_token = ?",
+                (now + self.visibility_timeout, now, normalize_url(url), LEASED, token)
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, url, token, record):
+        # Stores the result and marks the job done. Returns True if this call
+        # wrote the result, False if the job had already been completed.
+        with self._lock:
+            now = time.time()
+            cursor = self._db.execute(
+                "UPDATE jobs SET state = ?, result = ?, lease_token = NULL, last_error = NULL, updated = ?"
+                " WHERE key = ? AND state != ?",
+                (DONE, json.dumps(record, ensure_ascii=False), now, normalize_url(url), DONE)
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, url, token, error):
+        # Puts the job back with exponential backoff, or dead-letters it once
+        # it has used up its attempts. Ignored if the lease was lost.
+        with self._lock:
+            now = time.time()
+            db = self._transaction()
+            try:
+                row = db.execute(
+                    "SELECT attempts FROM jobs WHERE key = ? AND state = ? AND lease_token = ?",
+                    (normalize_url(url), LEASED, token)
+                ).fetchone()
+                if row is not None:
+                    attempts = row[0]
+                    if attempts >= self.max_attempts:
+                        state, available_at = DEAD, now
+                    else:
+                        state, available_at = PENDING, now + self.retry_backoff * 2 ** (attempts - 1)
+                    db.execute(
+                        "UPDATE jobs SET state = ?, available_at = ?, lease_token = NULL, last_error = ?, updated = ?"
+                        " WHERE key = ?",
+                        (state, available_at, error, now, normalize_url(url))
+                    )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            return row is not None
+
+    def requeue_dead(self):
+        with self._lock:
+            now = time.time()
+            cursor = self._db.execute(
+                "UPDATE jobs SET state = ?, attempts = 0, available_at = ?, updated = ? WHERE state = ?",
+                (PENDING, now, now, DEAD)
+            )
+            return cursor.rowcount
+
+    def dead_letters(self):
+        with self._lock:
+            rows = self._db.execute("SELECT url, attempts, last_error FROM jobs WHERE state = ? ORDER BY updated", (DEAD,))
+            return [{'url': url, 'attempts': attempts, 'error': error} for url, attempts, error in rows]
+
+    def results(self):
+        with self._lock:
+            rows = self._db.execute("SELECT result FROM jobs WHERE state = ? ORDER BY updated", (DONE,)).fetchall()
+        return [json.loads(result) for (result,) in rows]
+
+    def next_available(self):
+        # Seconds until some unfinished job can be leased, 0 if one can be
+        # leased now, or None when every job is done or dead.
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MIN(available_at) FROM jobs WHERE state IN (?, ?)", (PENDING, LEASED)
+            ).fetchone()
+            if row[0] is None:
+                return None
+            return max(0.0, row[0] - time.time())
+
+    def stats(self):
+        with self._lock:
+            counts = dict.fromkeys((PENDING, LEASED, DONE, DEAD), 0)
+            counts.update(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+            return counts
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class QueueFeed:
+    # Adapts a JobQueue to the batch runner: `urls()` leases jobs one at a
+    # time as the runner asks for them, `keep_alive()` renews the leases of
+    # jobs still in flight, and `finish(record)` acknowledges each result.
+    # The SQLite calls can wait up to the busy timeout on another consumer's
+    # write lock, so they run in a thread instead of on the event loop.
+
+    def __init__(self, jobs, poll_interval=2.0):
+        self.jobs = jobs
+        self.poll_interval = poll_interval
+        self.leases = {}
+
+    async def urls(self):
+        # Stops once every job is done or dead. While other consumers hold
+        # leases it keeps polling, since their jobs may come back.
+        while True:
+            leases = await asyncio.to_thread(self.jobs.lease, 1)
+            if leases:
+                url, token = leases[0]
+                self.leases[normalize_url(url)] = (url, token)
+                yield url
+                continue
+            wait = await asyncio.to_thread(self.jobs.next_available)
+            if wait is None:
+                return
+            await asyncio.sleep(min(max(wait, 0.05), self.poll_interval))
+
+    async def keep_alive(self):
+        while True:
+            await asyncio.sleep(self.jobs.visibility_timeout / 3)
+            for key, (url, token) in list(self.leases.items()):
+                if not await asyncio.to_thread(self.jobs.extend, url, token):
+                    self.leases.pop(key, None)
+
+    async def finish(self, record):
+        # Returns True when the record should be written to the local sinks:
+        # it succeeded and no other consumer had already completed the job.
+        lease = self.leases.pop(normalize_url(record['url']), None)
+        if lease is None:
+            return 'error' not in record
+        url, token = lease
+        if 'error' in record:
+            await asyncio.to_thread(self.jobs.fail, url, token, record['error'])
+            return False
+        return await asyncio.to_thread(self.jobs.complete, url, token, record)
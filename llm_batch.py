@@ -0,0 +1,136 @@
+from typing import Optional
+import asyncio
+
+from browser_use.llm.messages import SystemMessage, UserMessage
+from pydantic import BaseModel, create_model
+
+from dom_prune import estimate_tokens
+from schema import BookRecord, parse_record
+
+
+BATCH_PROMPT = """
+Extract the book described on each of the {count} product pages below.
+Return one record per page with `item` set to the page's item number.
+Use only values that appear in that page's text: the rating is the number of stars (1-5),
+the price has no currency symbol, and availability is the stock text as shown.
+Leave a field empty rather than guessing or copying it from another page.
+
+{pages}
+"""
+
+PAGE_TEMPLATE = "### ITEM {item} ({url})\n{text}\n"
+
+# Every BookRecord field, but optional: one bad page must not fail the whole
+# response, so each record is validated against BookRecord separately.
+BatchedRecord = create_model(
+    'BatchedRecord',
+    item=(int, ...),
+    **{name: (Optional[field.annotation], None) for name, field in BookRecord.model_fields.items()}
+)
+
+
+class BatchResult(BaseModel):
+    records: list[BatchedRecord]
+
+
+class LLMBatcher:
+    # Packs the pruned text of several product pages into one structured
+    # output call. Pages are collected for up to `max_wait` seconds, and a
+    # batch is sent as soon as it holds `max_items` pages or the next page
+    # would push it past `token_budget`. The response is split back per
+    # page; a page that is missing or fails validation raises ValueError for
+    # its caller only, so it can fall back to a call of its own.
+
+    def __init__(self, llm, tracer, max_items=8, token_budget=12_000, max_wait=0.1):
+        self.llm = llm
+        self.tracer = tracer
+        self.max_items = max_items
+        self.token_budget = token_budget
+        self.max_wait = max_wait
+        self.overhead = estimate_tokens(BATCH_PROMPT)
+        self.batches = 0
+        self.items = 0
+        self.failed_items = 0
+        self._pending = []
+        self._pending_tokens = self.overhead
+        self._timer = None
+        self._running = set()
+
+    async def extract(self, url, text):
+        # Sized with a placeholder item number; the page is formatted once,
+        # in _send, so braces in the text are left alone.
+        tokens = estimate_tokens(PAGE_TEMPLATE.format(item=0, url=url, text=text))
+        if self.overhead + tokens > self.token_budget:
+            raise ValueError(f"page too large to batch (~{tokens} tokens)")
+        if self._pending_tokens + tokens > self.token_budget:
+            self._flush()
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((url, text, future))
+        self._pending_tokens += tokens
+        if len(self._pending) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = [entry for entry in self._pending if not entry[2].done()]
+        self._pending = []
+        self._pending_tokens = self.overhead
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _send(self, batch):
+        # Every caller is waiting on a future of this batch, so whatever goes
+        # wrong here must end up on those futures rather than in the task.
+        try:
+            await self._send_batch(batch)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        except BaseException:
+            for _, _, future in batch:
+                future.cancel()
+            raise
+
+    async def _send_batch(self, batch):
+        pages = "\n".join(PAGE_TEMPLATE.format(item=item, url=url, text=text)
+                          for item, (url, text, _) in enumerate(batch))
+        messages = [
+            SystemMessage(content="You extract book details from several product pages at once."),
+            UserMessage(content=BATCH_PROMPT.format(count=len(batch), pages=pages)),
+        ]
+        self.batches += 1
+        self.items += len(batch)
+        with self.tracer.span('llm_batch', items=len(batch)) as span:
+            try:
+                response = await self.llm.ainvoke(messages, output_format=BatchResult)
+                records = {record.item: record for record in response.completion.records}
+            except Exception as e:
+                span.set(error=f"{type(e).__name__}: {e}")
+                records = {}
+
+            failed = 0
+            for item, (url, _, future) in enumerate(batch):
+                if future.done():
+                    continue
+                record = records.get(item)
+                try:
+                    if record is None:
+                        raise ValueError(f"{url} missing from batched response")
+                    future.set_result(parse_record(record.model_dump(exclude={'item'}, exclude_none=True)))
+                except ValueError as e:
+                    failed += 1
+                    future.set_exception(e)
+            self.failed_items += failed
+            span.set(failed=failed)
+
+    def stats(self):
+        return {'batches': self.batches, 'items': self.items, 'failed_items': self.failed_items}
@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+
+from browser_use.llm.views import ChatInvokeCompletion, ChatInvokeUsage
+
+
+# Parts of the agent prompt that change on every call without changing what
+# the model should answer; they are blanked out before hashing.
+VOLATILE_PATTERNS = [
+    re.compile(r'Current date(?: and time)?:[^\n"]*'),
+    re.compile(r'Step \d+ of \d+ max possible steps'),
+]
+
+
+class _Call:
+    # One upstream request and how many callers are waiting for it.
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class CachingLLM:
+    # Wraps a browser_use chat model. Identical prompts are answered from a
+    # persistent SQLite store, and identical prompts that are already in
+    # flight share one upstream call instead of each paying for it. The
+    # upstream call runs in a task of its own, so a caller that gives up
+    # (e.g. the agent's llm_timeout) does not cancel it for the others; it
+    # is only cancelled once nobody is waiting for it.
+
+    def __init__(self, llm, path='cache/llm.sqlite'):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.llm = llm
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.saved_tokens = 0
+        self.store_errors = 0
+        self._inflight = {}
+        # Worker processes share the file: WAL lets readers run beside a
+        # writer, and the long timeout waits out another process's commit.
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " completion TEXT NOT NULL,"
+            " usage TEXT)"
+        )
+        self._db.commit()
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    @property
+    def model(self):
+        return self.llm.model
+
+    @property
+    def provider(self):
+        return self.llm.provider
+
+    @property
+    def name(self):
+        return self.llm.name
+
+    @property
+    def model_name(self):
+        return self.llm.model_name
+
+    def make_key(self, messages, output_format=None):
+        payload = json.dumps(
+            [m.model_dump(mode='json') for m in messages],
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        for pattern in VOLATILE_PATTERNS:
+            payload = pattern.sub('', payload)
+        schema = ''
+        if output_format is not None:
+            schema = json.dumps(output_format.model_json_schema(), sort_keys=True)
+        raw = "\n".join([self.llm.provider, self.llm.model, schema, payload])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    async def ainvoke(self, messages, output_format=None, **kwargs):
+        # kwargs (e.g. the agent's session_id) are passed upstream but are not
+        # part of the key.
+        key = self.make_key(messages, output_format)
+
+        cached = self._load(key, output_format)
+        if cached is not None:
+            self.hits += 1
+            if cached.usage is not None:
+                self.saved_tokens += cached.usage.total_tokens
+            return cached
+
+        call = self._inflight.get(key)
+        if call is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            call = self._inflight[key] = _Call(asyncio.ensure_future(self._fetch(key, messages, output_format, kwargs)))
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody wants the answer any more; a new caller starts afresh.
+                self._forget(key, call.task)
+                call.task.cancel()
+
+    async def _fetch(self, key, messages, output_format, kwargs):
+        try:
+            result = await self.llm.ainvoke(messages, output_format, **kwargs)
+        finally:
+            self._forget(key, asyncio.current_task())
+        try:
+            self._store(key, result, output_format)
+        except sqlite3.Error as e:
+            # The answer is paid for and still good; only caching it failed.
+            self.store_errors += 1
+            print(f"LLM cache store failed: {type(e).__name__}: {e}")
+        return result
+
+    def _forget(self, key, task):
+        call = self._inflight.get(key)
+        if call is not None and call.task is task:
+            del self._inflight[key]
+
+    def _load(self, key, output_format):
+        row = self._db.execute("SELECT completion, usage FROM completions WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        if output_format is not None:
+            completion = output_format.model_validate_json(row[0])
+        else:
+            completion = json.loads(row[0])
+        usage = None
+        if row[1]:
+            usage = ChatInvokeUsage.model_validate_json(row[1])
+        return ChatInvokeCompletion(completion=completion, usage=usage)
+
+    def _store(self, key, result, output_format):
+        if output_format is not None:
+            completion = result.completion.model_dump_json()
+        else:
+            completion = json.dumps(result.completion, ensure_ascii=False)
+        usage = result.usage.model_dump_json() if result.usage is not None else None
+        self._db.execute(
+            "INSERT OR REPLACE INTO completions (key, model, completion, usage) VALUES (?, ?, ?, ?)",
+            (key, self.llm.model, completion, usage)
+        )
+        self._db.commit()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'saved_tokens': self.saved_tokens,
+            'store_errors': self.store_errors,
+        }
+
+    def close(self):
+        self._db.close()
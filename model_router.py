@@ -0,0 +1,164 @@
+from collections import deque
+import asyncio
+import time
+
+
+class ModelStats:
+    # Outcomes and recent latencies of one routed model. The p95 of the
+    # recent successful calls is the point where a call gets hedged.
+
+    def __init__(self, window=200):
+        self.calls = 0
+        self.ok = 0
+        self.failed = 0
+        self.step_failures = 0
+        self.escalations = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.total_ms = 0.0
+        self.latencies = deque(maxlen=window)
+
+    def p95(self):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+    def stats(self):
+        return {
+            'calls': self.calls,
+            'ok': self.ok,
+            'failed': self.failed,
+            'step_failures': self.step_failures,
+            'escalations': self.escalations,
+            'hedged': self.hedged,
+            'hedge_wins': self.hedge_wins,
+            'total_ms': round(self.total_ms, 1),
+            'max_p95_ms': round(self.p95() * 1000, 1),
+        }
+
+
+class ModelRouter:
+    # Presents a list of browser_use chat models, cheapest first, as one
+    # model. Every call starts on the cheapest model the agent session is
+    # currently at (calls without a session_id, like the static-HTML
+    # extraction, always start at the bottom). A call that raises, which
+    # includes a response failing the output schema, is retried on the next
+    # model and moves the session up with it; `step_done` does the same when
+    # agent steps keep failing. Sessions never step back down.
+    #
+    # Once a model has `min_samples` successful calls, a call still running
+    # at that model's p95 latency gets a duplicate request, and whichever
+    # answers first wins.
+
+    def __init__(self, llms, tracer=None, hedge=True, min_samples=20, escalate_after=1, window=200):
+        if not llms:
+            raise ValueError("ModelRouter needs at least one model")
+        self.llms = list(llms)
+        self.tracer = tracer
+        self.hedge = hedge
+        self.min_samples = min_samples
+        self.escalate_after = escalate_after
+        self.models = [ModelStats(window) for _ in self.llms]
+        self._sessions = {}
+
+    def __getattr__(self, name):
+        return getattr(self.llms[0], name)
+
+    @property
+    def model(self):
+        return '>'.join(llm.model for llm in self.llms)
+
+    @property
+    def provider(self):
+        return self.llms[0].provider
+
+    @property
+    def name(self):
+        return self.model
+
+    @property
+    def model_name(self):
+        return self.model
+
+    def step_done(self, session_id, consecutive_failures):
+        # Called after each agent step with the agent's failure streak.
+        tier = self._sessions.get(session_id, 0)
+        if consecutive_failures:
+            self.models[tier].step_failures += 1
+        if consecutive_failures >= self.escalate_after and tier + 1 < len(self.llms):
+            self.models[tier].escalations += 1
+            self._sessions[session_id] = tier + 1
+
+    def end_session(self, session_id):
+        self._sessions.pop(session_id, None)
+
+    async def ainvoke(self, messages, output_format=None, **kwargs):
+        session_id = kwargs.get('session_id')
+        tier = self._sessions.get(session_id, 0)
+        while True:
+            try:
+                return await self._invoke(tier, messages, output_format, kwargs)
+            except Exception:
+                if tier + 1 >= len(self.llms):
+                    raise
+                self.models[tier].escalations += 1
+                tier += 1
+                if session_id is not None:
+                    self._sessions[session_id] = max(tier, self._sessions.get(session_id, 0))
+
+    async def _invoke(self, tier, messages, output_format, kwargs):
+        stats = self.models[tier]
+        first = asyncio.ensure_future(self._call(tier, messages, output_format, kwargs, hedge=False))
+        pending = {first}
+        if self.hedge and len(stats.latencies) >= self.min_samples:
+            done, pending = await asyncio.wait(pending, timeout=stats.p95())
+            if not done:
+                stats.hedged += 1
+                pending.add(asyncio.ensure_future(self._call(tier, messages, output_format, kwargs, hedge=True)))
+            else:
+                pending = done
+        try:
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            stats.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _call(self, tier, messages, output_format, kwargs, hedge):
+        llm = self.llms[tier]
+        stats = self.models[tier]
+        stats.calls += 1
+        started = time.perf_counter()
+        span = self.tracer.start_span('llm_attempt', model=llm.model, tier=tier, hedge=hedge) if self.tracer else None
+        try:
+            result = await llm.ainvoke(messages, output_format, **kwargs)
+        except asyncio.CancelledError:
+            # The other request of a hedged pair answered first.
+            if span is not None:
+                span.set(cancelled=True)
+                span.end()
+            raise
+        except Exception as e:
+            stats.failed += 1
+            if span is not None:
+                span.end(error=e)
+            raise
+        elapsed = time.perf_counter() - started
+        stats.ok += 1
+        stats.total_ms += elapsed * 1000
+        stats.latencies.append(elapsed)
+        if span is not None:
+            span.end()
+        return result
+
+    def stats(self):
+        return {llm.model: stats.stats() for llm, stats in zip(self.llms, self.models)}
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+
+# Text length of the first match for every selector, or null if any is missing.
+_SNAPSHOT_JS = """
+(selectors) => {
+    const sizes = [];
+    for (const selector of selectors) {
+        const el = document.querySelector(selector);
+        if (!el) return null;
+        sizes.push((el.textContent || '').length);
+    }
+    return sizes;
+}
+"""
+
+
+class ReadyResult:
+
+    def __init__(self, ready, waited):
+        self.ready = ready
+        self.waited = waited
+
+    def __repr__(self):
+        return f"ReadyResult(ready={self.ready}, waited={self.waited:.3f})"
+
+
+async def wait_until_ready(page, selectors, ceiling=6.0, stable_for=0.2, poll_interval=0.05):
+    # Returns as soon as every selector is present and its text has stopped
+    # changing for `stable_for` seconds. `ceiling` is the old fixed wait and
+    # only applies when the page never settles.
+    selectors = list(selectors) or ['body']
+    start = time.monotonic()
+    last = None
+    stable_since = None
+
+    while True:
+        now = time.monotonic()
+        try:
+            snapshot = await page.evaluate(_SNAPSHOT_JS, selectors)
+        except Exception:
+            # The document was replaced mid-poll (redirect, late navigation).
+            snapshot = None
+
+        if snapshot is not None and snapshot == last:
+            if stable_since is None:
+                stable_since = now
+            if now - stable_since >= stable_for:
+                return ReadyResult(True, now - start)
+        else:
+            stable_since = None
+        last = snapshot
+
+        if now - start >= ceiling:
+            return ReadyResult(False, now - start)
+        await asyncio.sleep(poll_interval)
+
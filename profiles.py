@@ -0,0 +1,73 @@
+import os
+import random
+
+
+RECORD_MODES = ('off', 'always', 'on_failure', 'sample')
+
+# Runtime profiles. "demo" is the original behaviour (headed browser, every
+# run recorded, a screenshot on every agent step); "production" is for
+# throughput runs and skips all demo artifacts; "debug" keeps videos only for
+# runs that failed. `vision` is a vision_policy.VISION_MODES entry.
+PROFILES = {
+    'demo': {
+        'headless': False,
+        'record_video': 'always',
+        'video_sample_rate': 1.0,
+        'save_history': True,
+        'save_gif': False,
+        'block_resources': (),
+        'vision': 'full',
+    },
+    'production': {
+        'headless': True,
+        'record_video': 'off',
+        'video_sample_rate': 0.0,
+        'save_history': False,
+        'save_gif': False,
+        'block_resources': ('image', 'media', 'font'),
+        'vision': 'adaptive',
+    },
+    'debug': {
+        'headless': True,
+        'record_video': 'on_failure',
+        'video_sample_rate': 0.0,
+        'save_history': True,
+        'save_gif': False,
+        'block_resources': ('media', 'font'),
+        'vision': 'adaptive',
+    },
+}
+
+DEFAULT_PROFILE = 'demo'
+
+
+def load_profile(name=None, record_video=None, video_sample_rate=None):
+    # CLI values win over the environment (RUN_PROFILE, RECORD_VIDEO,
+    # VIDEO_SAMPLE_RATE in .env), which wins over the profile defaults.
+    name = name or os.getenv('RUN_PROFILE') or DEFAULT_PROFILE
+    if name not in PROFILES:
+        raise ValueError(f"unknown profile {name!r}; choose from {', '.join(PROFILES)}")
+    profile = dict(PROFILES[name], name=name)
+
+    record_video = record_video or os.getenv('RECORD_VIDEO')
+    if record_video:
+        if record_video not in RECORD_MODES:
+            raise ValueError(f"unknown record mode {record_video!r}; choose from {', '.join(RECORD_MODES)}")
+        profile['record_video'] = record_video
+
+    if video_sample_rate is None and os.getenv('VIDEO_SAMPLE_RATE'):
+        video_sample_rate = float(os.getenv('VIDEO_SAMPLE_RATE'))
+    if video_sample_rate is not None:
+        profile['video_sample_rate'] = video_sample_rate
+    return profile
+
+
+def should_record(profile):
+    mode = profile['record_video']
+    if mode == 'sample':
+        return random.random() < profile['video_sample_rate']
+    return mode in ('always', 'on_failure')
+
+
+def keep_recording(profile, failed):
+    return profile['record_video'] != 'on_failure' or failed
@@ -0,0 +1,164 @@
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+import asyncio
+import time
+
+
+BACKOFF_STATUSES = (429, 503)
+
+
+class RobotsDisallowed(Exception):
+    # The site's robots.txt disallows the URL; no tier may fetch it.
+    pass
+
+
+class TokenBucket:
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def set_rate(self, rate):
+        self.rate = rate
+
+    async def take(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class DomainState:
+
+    def __init__(self, qps, burst, concurrency):
+        self.bucket = TokenBucket(qps, burst) if qps else None
+        self.slots = asyncio.Semaphore(concurrency)
+        self.paused_until = 0.0
+        self.failures = 0
+        self.robots = None
+        self.robots_checked = False
+        # Held while robots.txt is fetched, so one slow host does not hold
+        # up the first request to every other domain.
+        self.robots_lock = asyncio.Lock()
+        self.requests = 0
+        self.backoffs = 0
+        self.queue_delay_total = 0.0
+        self.queue_delay_max = 0.0
+
+
+def retry_after_seconds(headers):
+    value = headers.get('retry-after') if headers else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class DomainScheduler:
+    # Politeness shared by every worker: per-domain token bucket (qps/burst),
+    # a cap on concurrent requests per domain, robots.txt Crawl-delay and
+    # Disallow rules, and a domain-wide pause after 429/503 responses.
+
+    def __init__(self, qps=5.0, burst=5, concurrency=8, respect_robots=True,
+                 user_agent='*', max_backoff=120.0):
+        self.qps = qps
+        self.burst = burst
+        self.concurrency = concurrency
+        self.respect_robots = respect_robots
+        self.user_agent = user_agent
+        self.max_backoff = max_backoff
+        self.domains = {}
+
+    def _state(self, url):
+        host = urlsplit(url).hostname or ''
+        if host not in self.domains:
+            self.domains[host] = DomainState(self.qps, self.burst, self.concurrency)
+        return self.domains[host]
+
+    async def load_robots(self, url, fetch_text):
+        # fetch_text(url) -> str or None; called once per domain.
+        state = self._state(url)
+        if not self.respect_robots or state.robots_checked:
+            return
+        async with state.robots_lock:
+            if state.robots_checked:
+                return
+            state.robots_checked = True
+            parts = urlsplit(url)
+            text = await fetch_text(f"{parts.scheme}://{parts.netloc}/robots.txt")
+            if text is None:
+                return
+            robots = RobotFileParser()
+            robots.parse(text.splitlines())
+            state.robots = robots
+            delay = robots.crawl_delay(self.user_agent)
+            if delay:
+                rate = 1.0 / float(delay)
+                if state.bucket is None:
+                    state.bucket = TokenBucket(rate, 1)
+                elif rate < state.bucket.rate:
+                    state.bucket.set_rate(rate)
+                    state.bucket.burst = 1
+
+    def allowed(self, url):
+        state = self._state(url)
+        return state.robots is None or state.robots.can_fetch(self.user_agent, url)
+
+    @asynccontextmanager
+    async def slot(self, url):
+        state = self._state(url)
+        queued = time.monotonic()
+        async with state.slots:
+            while True:
+                pause = state.paused_until - time.monotonic()
+                if pause <= 0:
+                    break
+                await asyncio.sleep(pause)
+            if state.bucket is not None:
+                await state.bucket.take()
+            delay = time.monotonic() - queued
+            state.requests += 1
+            state.queue_delay_total += delay
+            state.queue_delay_max = max(state.queue_delay_max, delay)
+            yield
+
+    def record_response(self, url, status, headers=None):
+        # Returns the backoff in seconds when the domain asked us to slow
+        # down, otherwise None.
+        state = self._state(url)
+        if status not in BACKOFF_STATUSES:
+            state.failures = 0
+            return None
+        state.failures += 1
+        state.backoffs += 1
+        delay = retry_after_seconds(headers)
+        if delay is None:
+            delay = 2 ** state.failures
+        delay = min(delay, self.max_backoff)
+        state.paused_until = max(state.paused_until, time.monotonic() + delay)
+        return delay
+
+    def stats(self):
+        return {
+            host: {
+                'requests': state.requests,
+                'backoffs': state.backoffs,
+                'total_queue_delay': round(state.queue_delay_total, 3),
+                'max_queue_delay': round(state.queue_delay_max, 3),
+            }
+            for host, state in self.domains.items()
+        }
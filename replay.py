@@ -0,0 +1,243 @@
+from urllib.parse import urlparse
+import json
+import os
+import re
+import time
+
+from schema import BookRecord
+from site_templates import RATING_WORDS, validate_record
+
+
+# Agent actions that only read the page or talk to the model; they are left
+# out of a compiled flow because the field selectors replace them.
+PASSIVE_ACTIONS = {'extract', 'done', 'wait', 'screenshot', 'search_page', 'find_elements',
+                   'dropdown_options', 'read_file', 'write_file', 'replace_file', 'save_as_pdf'}
+
+# How each schema field's text is turned back into a value on replay.
+FIELD_PARSERS = {'price': 'number', 'rating': 'rating'}
+
+
+# Finds, for each field value, the smallest element whose text matches it and
+# returns a CSS path for it. Paths use ids and classes rather than positions,
+# so they survive sidebars and banners being added or pruned.
+_LEARN_JS = """
+([values, ratingWords]) => {
+    const norm = (s) => (s || '').replace(/\\s+/g, ' ').trim().toLowerCase();
+    const cssPath = (el) => {
+        const parts = [];
+        while (el && el !== document.body && el.nodeType === 1) {
+            if (el.id && /^[A-Za-z][\\w-]*$/.test(el.id)) {
+                parts.unshift('#' + el.id);
+                break;
+            }
+            const classes = Array.from(el.classList).filter(c => /^[A-Za-z][\\w-]*$/.test(c) && !ratingWords.includes(c));
+            parts.unshift(el.tagName.toLowerCase() + classes.map(c => '.' + c).join(''));
+            el = el.parentElement;
+        }
+        return parts.join(' > ');
+    };
+    const all = Array.from(document.body.querySelectorAll('*'));
+    const found = {};
+    for (const [field, kind, value] of values) {
+        let best = null;
+        for (const el of all) {
+            const text = norm(el.innerText);
+            let match = false;
+            if (kind === 'rating') {
+                const word = ratingWords[value - 1];
+                match = el.classList.contains(word) || text === String(value) || text.startsWith(value + ' ');
+            } else if (kind === 'number') {
+                match = text.includes(value) && text.length <= value.length + 8;
+            } else {
+                match = text === norm(value) || (norm(value).length > 40 && text.startsWith(norm(value).slice(0, 40)));
+            }
+            if (match && (!best || best.contains(el))) best = el;
+        }
+        if (best) found[field] = cssPath(best);
+    }
+    return found;
+}
+"""
+
+# Reads the text and classes of the first match of every field selector.
+_READ_JS = """
+(selectors) => {
+    const out = {};
+    for (const [field, selector] of Object.entries(selectors)) {
+        const el = document.querySelector(selector);
+        out[field] = el ? [el.innerText || el.textContent || '', Array.from(el.classList)] : null;
+    }
+    return out;
+}
+"""
+
+
+class ReplayMiss(Exception):
+    pass
+
+
+def _host(url):
+    host = (urlparse(url).hostname or '').lower()
+    return host[4:] if host.startswith('www.') else host
+
+
+def _parse_field(kind, text, classes):
+    text = text.strip()
+    if kind == 'number':
+        return float(re.sub(r'[^\d.]', '', text))
+    if kind == 'rating':
+        for cls in classes:
+            if cls in RATING_WORDS:
+                return RATING_WORDS[cls]
+        return int(re.search(r'\d', text).group())
+    return text
+
+
+def compile_steps(history, url):
+    # The interactions the agent needed before the data was visible (clicks,
+    # typing, scrolling), keyed by XPath. Returns None when the run did
+    # something a different product page could not repeat, like navigating
+    # away or switching tabs.
+    steps = []
+    for action in history.model_actions():
+        element = action.pop('interacted_element', None)
+        name, params = next(iter(action.items()))
+        if name in PASSIVE_ACTIONS:
+            continue
+        if name == 'navigate' and params.get('url') == url:
+            continue
+        if name in ('click', 'input') and element is not None:
+            step = {'op': name, 'xpath': element.x_path}
+            if name == 'input':
+                step['text'] = params.get('text', '')
+            steps.append(step)
+        elif name == 'scroll' and params.get('index') is None:
+            steps.append({'op': 'scroll', 'down': params.get('down', True), 'pages': params.get('pages', 1.0)})
+        elif name == 'send_keys':
+            steps.append({'op': 'keys', 'keys': params['keys']})
+        else:
+            return None
+    return steps
+
+
+async def learn_fields(page, record):
+    # Field name -> CSS selector, or None unless every field was located.
+    values = []
+    for field, value in record.items():
+        kind = FIELD_PARSERS.get(field, 'text')
+        values.append([field, kind, f"{value:.2f}" if kind == 'number' else value])
+    selectors = await page.evaluate(_LEARN_JS, [values, list(RATING_WORDS)])
+    if set(selectors) != set(record):
+        return None
+    return selectors
+
+
+class FlowStore:
+    # Flows learned from successful agent runs, one JSON file per site. A
+    # flow is the agent's interactions plus a selector for every field, so a
+    # later page of the same site is extracted without the LLM. A flow that
+    # keeps missing is dropped and relearned on the next agent run.
+
+    def __init__(self, directory='flows', max_misses=3):
+        self.directory = directory
+        self.max_misses = max_misses
+        self.flows = {}
+        self.replays = 0
+        self.misses = 0
+        self.learned = 0
+
+    def _path(self, host):
+        return os.path.join(self.directory, f"{host}.json")
+
+    def get(self, url):
+        host = _host(url)
+        if host not in self.flows:
+            try:
+                with open(self._path(host), encoding='utf-8') as f:
+                    self.flows[host] = json.load(f)
+            except (OSError, ValueError):
+                self.flows[host] = None
+        flow = self.flows[host]
+        if flow is None or flow.get('schema') != list(BookRecord.model_fields):
+            return None
+        return flow
+
+    def _save(self, host, flow):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(host)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(flow, f, indent=2, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+        self.flows[host] = flow
+
+    async def learn(self, url, history, page, record):
+        # Returns True when a flow was compiled and stored for the site.
+        steps = compile_steps(history, url)
+        if steps is None:
+            return False
+        selectors = await learn_fields(page, record)
+        if selectors is None:
+            return False
+        self._save(_host(url), {
+            'schema': list(BookRecord.model_fields),
+            'learned_from': url,
+            'learned_at': time.time(),
+            'steps': steps,
+            'fields': {field: {'selector': selector, 'parse': FIELD_PARSERS.get(field, 'text')}
+                       for field, selector in selectors.items()},
+            'misses': 0,
+        })
+        self.learned += 1
+        return True
+
+    async def replay(self, page, flow, step_timeout=3.0):
+        # Runs the flow on a loaded and pruned page (flows are learned on
+        # pruned pages, so XPaths line up) and returns the validated record.
+        # Raises ReplayMiss when a step or a field does not match.
+        try:
+            await self._replay_steps(page, flow['steps'], step_timeout)
+            raw = await page.evaluate(_READ_JS, {field: spec['selector'] for field, spec in flow['fields'].items()})
+            record = {}
+            for field, spec in flow['fields'].items():
+                if raw.get(field) is None:
+                    raise ReplayMiss(f"no element for {field}")
+                record[field] = _parse_field(spec['parse'], *raw[field])
+        except ReplayMiss:
+            self._missed(flow)
+            raise
+        except Exception as e:
+            self._missed(flow)
+            raise ReplayMiss(f"{type(e).__name__}: {e}") from e
+        record = validate_record(record)
+        if record is None:
+            self._missed(flow)
+            raise ReplayMiss("replayed fields did not validate")
+        self.replays += 1
+        flow['misses'] = 0
+        return record
+
+    async def _replay_steps(self, page, steps, timeout):
+        for step in steps:
+            if step['op'] == 'click':
+                await page.locator(f"xpath=/{step['xpath']}").first.click(timeout=timeout * 1000)
+            elif step['op'] == 'input':
+                await page.locator(f"xpath=/{step['xpath']}").first.fill(step['text'], timeout=timeout * 1000)
+            elif step['op'] == 'scroll':
+                height = await page.evaluate("window.innerHeight")
+                await page.mouse.wheel(0, height * step['pages'] * (1 if step['down'] else -1))
+            elif step['op'] == 'keys':
+                await page.keyboard.press(step['keys'])
+
+    def _missed(self, flow):
+        self.misses += 1
+        flow['misses'] = flow.get('misses', 0) + 1
+        if flow['misses'] >= self.max_misses:
+            host = _host(flow['learned_from'])
+            self.flows[host] = None
+            try:
+                os.remove(self._path(host))
+            except OSError:
+                pass
+
+    def stats(self):
+        return {'replays': self.replays, 'misses': self.misses, 'learned': self.learned}
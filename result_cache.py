@@ -0,0 +1,165 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ResultCache:
+    # On-disk cache of extraction results. An entry only matches when the URL,
+    # the task schema and the page fingerprint (a hash of the content the
+    # caller cares about) are all unchanged. Per URL it also keeps the HTTP
+    # validators of the response the entry came from, so a refresh can ask
+    # the server with a conditional request and skip the body entirely on 304.
+    # Entries expire after `ttl` seconds and the least recently used ones are
+    # dropped once the cache holds more than `max_entries`.
+
+    def __init__(self, path='cache/results.sqlite', ttl=7 * 24 * 3600, max_entries=100_000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self._puts = 0
+        self._db = sqlite3.connect(path, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY,"
+            " url TEXT NOT NULL,"
+            " record TEXT NOT NULL,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS validators ("
+            " url TEXT NOT NULL,"
+            " schema TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " PRIMARY KEY (url, schema))"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def make_key(url, schema, fingerprint):
+        raw = "\n".join([normalize_url(url), schema, fingerprint])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _lookup(self, key):
+        row = self._db.execute("SELECT record, created FROM results WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is None or now - row[1] > self.ttl:
+            return None
+        self._db.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+        self._db.commit()
+        return json.loads(row[0])
+
+    def _validators(self, url, schema):
+        return self._db.execute(
+            "SELECT key, etag, last_modified FROM validators WHERE url = ? AND schema = ?",
+            (normalize_url(url), schema)
+        ).fetchone()
+
+    def _store_validators(self, url, schema, key, headers):
+        headers = headers or {}
+        self._db.execute(
+            "INSERT OR REPLACE INTO validators (url, schema, key, etag, last_modified) VALUES (?, ?, ?, ?, ?)",
+            (normalize_url(url), schema, key, headers.get('etag'), headers.get('last-modified'))
+        )
+
+    def conditional_headers(self, url, schema):
+        # If-None-Match / If-Modified-Since for the response behind the cached
+        # entry, or None when there is nothing usable to revalidate.
+        row = self._validators(url, schema)
+        if row is None or not (row[1] or row[2]):
+            return None
+        created = self._db.execute("SELECT created FROM results WHERE key = ?", (row[0],)).fetchone()
+        if created is None or time.time() - created[0] > self.ttl:
+            return None
+        headers = {}
+        if row[1]:
+            headers['If-None-Match'] = row[1]
+        if row[2]:
+            headers['If-Modified-Since'] = row[2]
+        return headers
+
+    def get_not_modified(self, url, schema):
+        # The entry a 304 response refers to.
+        row = self._validators(url, schema)
+        record = self._lookup(row[0]) if row is not None else None
+        if record is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.not_modified += 1
+        return record
+
+    def get(self, url, schema, fingerprint, headers=None):
+        key = self.make_key(url, schema, fingerprint)
+        record = self._lookup(key)
+        if record is None:
+            self.misses += 1
+            return None
+        # The body changed outside the fingerprinted region; keep the newer
+        # validators so the next refresh can be conditional again. Without
+        # the response headers the stored ones are left as they are.
+        if headers is not None:
+            self._store_validators(url, schema, key, headers)
+            self._db.commit()
+        self.hits += 1
+        return record
+
+    def put(self, url, schema, fingerprint, record, headers=None):
+        now = time.time()
+        key = self.make_key(url, schema, fingerprint)
+        self._db.execute(
+            "INSERT OR REPLACE INTO results (key, url, record, created, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, normalize_url(url), json.dumps(record, ensure_ascii=False), now, now)
+        )
+        self._store_validators(url, schema, key, headers)
+        self._puts += 1
+        if self._puts % 100 == 0:
+            self.evict()
+        self._db.commit()
+
+    def evict(self):
+        self._db.execute("DELETE FROM results WHERE created < ?", (time.time() - self.ttl,))
+        count = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed LIMIT ?)",
+                (count - self.max_entries,)
+            )
+        self._db.execute("DELETE FROM validators WHERE key NOT IN (SELECT key FROM results)")
+        self._db.commit()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'not_modified': self.not_modified}
+
+    def close(self):
+        self.evict()
+        self._db.close()
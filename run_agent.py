@@ -1,73 +1,922 @@
-from browser_use import Agent, ChatGoogle
+from browser_use import Agent, BrowserSession, ChatGoogle
+from browser_use.llm.messages import SystemMessage, UserMessage
+from artifacts import ArtifactManager
+from browser_pool import BrowserPool
+from crawler import Crawler, MemoryFrontier, SqliteFrontier
+from dom_prune import content_fingerprint, main_text, prune_page
 from dotenv import load_dotenv
+from fetcher import HttpFetcher, needs_javascript
+from history_store import HistoryStore
+from interception import DEFAULT_DENY_DOMAINS, RESOURCE_TYPES, RequestFilter
+from job_queue import JobQueue, QueueFeed
+from llm_batch import LLMBatcher
+from llm_cache import CachingLLM
+from model_router import ModelRouter
+from page_ready import wait_until_ready
+from profiles import PROFILES, RECORD_MODES, keep_recording, load_profile, should_record
+from rate_limit import DomainScheduler
+from replay import FlowStore, ReplayMiss
+from result_cache import ResultCache, content_hash
+from schema import BookRecord, parse_record, validation_error_text
+from tracing import TracedLLM, Tracer
+from vision_policy import VISION_MODES, VisionPolicy
+from workers import Supervisor, split_rate
+from sinks import CsvSink, JsonlSink, MultiSink, ParquetSink, completed_urls
+from site_templates import extract_with_template, readiness_selectors
+import argparse
 import asyncio
-import os
-import glob
-    
+import json
+import sqlite3
+
 
 load_dotenv()
-    
-async def main():
-    
-    llm = ChatGoogle(model="gemini-2.5-flash") 
-    
-    
-    task = """
-Go to http://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html.
+
+DEFAULT_URL = "http://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html"
+
+TASK_TEMPLATE = """
+{navigation}
 I want to create a two-site comparison page for this book.
-Please extract the following information and present it as a single JSON object:
+Please extract the following information and return it in the structured output format:
 1. The book title.
 2. The 5-star rating (as a number, e.g., 2).
 3. The price (excluding the currency symbol).
 4. The product description text.
 5. The stock availability (e.g., "In stock (22 available)").
 """
-    
-    
-    print("Agent running... Waiting for browser automation to start.")
-    
-    
-    agent = Agent(
-        task=task,
-        llm=llm,
-        save_gif=False,  
-        save_history=True,
-        browser_config={
-            
-            'headless': False, 
-            'record_video': {
-                'dir': 'videos/', 
-                'size': {'width': 800, 'height': 600}
-            },
-            'args': ['--no-sandbox'], 
-            'wait_for_network_idle_page_load_time': 6.0 
+
+TASK_SCHEMA = content_hash(TASK_TEMPLATE + json.dumps(BookRecord.model_json_schema(), sort_keys=True))
+
+REPAIR_PROMPT = """
+The text below was meant to describe one book but did not match the required schema.
+Validation errors: {errors}
+Return only the corrected record. Do not invent values that are not in the text.
+
+{raw}
+"""
+
+HTML_EXTRACT_PROMPT = """
+Extract the book described on this product page ({url}).
+Use only values that appear in the page text: the rating is the number of stars (1-5),
+the price has no currency symbol, and availability is the stock text as shown.
+
+{text}
+"""
+
+# Extraction tiers, cheapest first.
+TIERS = ('template', 'http_llm', 'browser')
+
+# Record fields that belong to one run (its recording and stored history)
+# rather than to the page; they are not cached or served from the cache.
+RUN_FIELDS = ('run_id', 'video', 'gif', 'thumbnail', 'history_id')
+
+
+def without_run_fields(record):
+    # Entries cached before RUN_FIELDS existed may still carry them.
+    return {key: value for key, value in record.items() if key not in RUN_FIELDS}
+
+
+def build_task(url, preloaded=False):
+    if preloaded:
+        navigation = f"The page {url} is already open in the current tab; do not navigate away from it."
+    else:
+        navigation = f"Go to {url}."
+    return TASK_TEMPLATE.format(navigation=navigation)
+
+
+def build_browser_config(profile):
+    config = {
+        'headless': profile['headless'],
+        'args': ['--no-sandbox'],
+        'wait_for_network_idle_page_load_time': 6.0
+    }
+    if profile['record_video'] != 'off':
+        config['record_video'] = {
+            'dir': 'videos/',
+            'size': {'width': 800, 'height': 600}
         }
+    return config
+
+
+class Extractor:
+
+    def __init__(self, llm, pool, fetcher, profile, tracer, cache=None, llm_cache=None,
+                 ready_timeout=6.0, ready_selectors=None, tiers=TIERS, flows=None, batcher=None, artifacts=None,
+                 history=None, vision=None, router=None):
+        self.llm = llm
+        self.tiers = tuple(tiers)
+        self.tracer = tracer
+        self.llm_cache = llm_cache
+        self.pool = pool
+        self.fetcher = fetcher
+        self.profile = profile
+        self.cache = cache
+        self.ready_timeout = ready_timeout
+        self.ready_selectors = ready_selectors or []
+        self.flows = flows
+        self.batcher = batcher
+        self.artifacts = artifacts
+        self.history = history
+        self.vision = vision
+        self.router = router
+
+    async def extract(self, url):
+        with self.tracer.span('extract', url=url) as span:
+            record = await self.extract_traced(url)
+            span.set(source=record['source'], cached=record.get('cached', False))
+            return record
+
+    async def extract_traced(self, url):
+        # Unchanged pages come straight from the cache without touching the
+        # browser or the LLM: either the server answers the conditional
+        # request with 304, or the main-content region hashes the same as
+        # when the cached record was extracted.
+        headers = self.cache.conditional_headers(url, TASK_SCHEMA) if self.cache is not None else None
+        result = await self.fetch(url, headers)
+        if result is not None and result.status == 304:
+            cached = self.cache.get_not_modified(url, TASK_SCHEMA)
+            if cached is not None:
+                return {**without_run_fields(cached), 'cached': True, 'not_modified': True}
+            result = await self.fetch(url, None)
+
+        html = result.html if result is not None and result.ok else None
+        fingerprint = None
+        if html is not None and self.cache is not None:
+            fingerprint = self.fingerprint(url, html)
+            cached = self.cache.get(url, TASK_SCHEMA, fingerprint, result.headers)
+            if cached is not None:
+                return {**without_run_fields(cached), 'cached': True}
+
+        record = await self.extract_uncached(url, html)
+        if fingerprint is not None and record.get('result') is not None:
+            try:
+                self.cache.put(url, TASK_SCHEMA, fingerprint, without_run_fields(record), result.headers)
+            except sqlite3.Error as e:
+                # The extraction succeeded; only caching it failed.
+                print(f"Result cache store failed: {type(e).__name__}: {e}")
+        return record
+
+    async def fetch(self, url, headers):
+        with self.tracer.span('http_fetch', url=url, conditional=headers is not None) as span:
+            result = await self.fetcher.fetch(url, headers=headers)
+            if result is not None:
+                span.set(status=result.status, bytes=len(result.html))
+            return result
+
+    def fingerprint(self, url, html):
+        # A JavaScript shell's static HTML says nothing about the rendered
+        # content, so only the whole document counts for those pages.
+        if needs_javascript(html):
+            return content_hash(html)
+        return content_fingerprint(url, html)
+
+    async def close(self):
+        await self.fetcher.close()
+        if self.artifacts is not None:
+            self.artifacts.close()
+        if self.history is not None:
+            self.history.close()
+        if self.cache is not None:
+            self.cache.close()
+        if self.llm_cache is not None:
+            self.llm_cache.close()
+
+    async def extract_uncached(self, url, html):
+        # Tiers, cheapest first: a site template on the plain HTTP response,
+        # one structured LLM call on the static HTML when it already holds the
+        # content, and only then a browser with the agent.
+        if html is not None and 'template' in self.tiers:
+            with self.tracer.span('template'):
+                record = extract_with_template(url, html)
+            if record is not None:
+                return {'url': url, 'source': 'template', 'result': record}
+        if html is not None and 'http_llm' in self.tiers and not needs_javascript(html):
+            try:
+                record, tokens = await self.extract_from_html(url, html)
+                return {'url': url, 'source': 'http_llm', 'result': record.model_dump(), 'tokens': tokens}
+            except ValueError:
+                pass
+        if 'browser' not in self.tiers:
+            raise ValueError(f"no enabled tier could extract {url} ({', '.join(self.tiers)})")
+
+        record_video = should_record(self.profile)
+        async with self.pool.context(record_video=record_video) as context:
+            try:
+                record = await self.extract_in_browser(url, context)
+            except Exception:
+                if record_video:
+                    await self.finish_recording(context, url, failed=True)
+                raise
+            if record_video:
+                record.update(await self.finish_recording(context, url, failed=False))
+            return record
+
+    async def extract_in_browser(self, url, context):
+        # Open the page ourselves and return as soon as the fields are
+        # rendered; the old fixed network-idle wait is only the ceiling.
+        selectors = self.ready_selectors or readiness_selectors(url)
+        # The HTTP tier has usually checked robots.txt already; this also
+        # covers runs where it failed or is disabled.
+        await self.fetcher.check_robots(url)
+        scheduler = self.fetcher.scheduler
+        page = await context.new_page()
+        with self.tracer.span('navigation', url=url) as span:
+            # A 429/503 pauses the domain like on the HTTP tier, and the
+            # navigation is retried once the backoff has passed.
+            for _ in range(self.fetcher.max_retries + 1):
+                async with scheduler.slot(url):
+                    response = await page.goto(url, wait_until='domcontentloaded', timeout=self.ready_timeout * 1000 + 30000)
+                if response is None:
+                    break
+                span.set(status=response.status)
+                if scheduler.record_response(url, response.status, response.headers) is None:
+                    break
+        with self.tracer.span('page_ready') as span:
+            ready = await wait_until_ready(page, selectors, self.ready_timeout)
+            span.set(ready=ready.ready)
+        timing = {'ready_wait': round(ready.waited, 3), 'ready': ready.ready}
+
+        if 'template' in self.tiers:
+            with self.tracer.span('template', rendered=True):
+                record = extract_with_template(url, await page.content())
+            if record is not None:
+                return {'url': url, 'source': 'rendered_template', 'result': record, **timing}
+
+        # Strip boilerplate from the live DOM so every agent step serializes
+        # only the main content.
+        with self.tracer.span('dom_prune') as span:
+            tokens = await prune_page(page, url)
+            span.set(**tokens)
+
+        # A flow learned from an earlier agent run on this site replays its
+        # clicks and reads the fields directly; the agent only runs when
+        # there is no flow or a step no longer matches.
+        flow = self.flows.get(url) if self.flows is not None else None
+        if flow is not None:
+            with self.tracer.span('replay') as span:
+                try:
+                    record = await self.flows.replay(page, flow)
+                except ReplayMiss as e:
+                    span.set(miss=str(e))
+                    record = None
+            if record is not None:
+                return {'url': url, 'source': 'replay', 'result': record, 'tokens': tokens, **timing}
+
+        with self.tracer.span('agent_run'):
+            history = await self.run_agent(url, context, page)
+        tokens['step_input_tokens'] = [
+            item.metadata.input_tokens for item in history.history if item.metadata is not None
+        ]
+        history_id = None
+        if self.history is not None:
+            # Stored before parsing so runs with unusable output are kept too.
+            with self.tracer.span('history_write') as span:
+                span.set(steps=len(history.history))
+                try:
+                    history_id = await asyncio.to_thread(self.history.write, url, history)
+                except Exception as e:
+                    # Storing is best effort; the agent run itself succeeded.
+                    span.set(error=f"{type(e).__name__}: {e}")
+        with self.tracer.span('parse_result'):
+            record = await self.parse_agent_result(history.final_result())
+        if self.flows is not None and self.flows.get(url) is None:
+            with self.tracer.span('flow_learn') as span:
+                try:
+                    span.set(learned=await self.flows.learn(url, history, page, record.model_dump()))
+                except Exception as e:
+                    # Learning is best effort; the extraction itself succeeded.
+                    span.set(learned=False, error=f"{type(e).__name__}: {e}")
+        record = {'url': url, 'source': 'agent', 'result': record.model_dump(), 'tokens': tokens, **timing}
+        if history_id is not None:
+            record['history_id'] = history_id
+        return record
+
+    async def finish_recording(self, context, url, failed):
+        # Closing the pages finalizes their videos; in on_failure mode the
+        # recordings of successful runs are deleted straight away. Returns
+        # the record fields that point at the kept recording.
+        keep = keep_recording(self.profile, failed)
+        paths = []
+        for page in list(context.pages):
+            video = page.video
+            await page.close()
+            if video is None:
+                continue
+            if keep:
+                paths.append(await video.path())
+            else:
+                await video.delete()
+        if not paths:
+            return {}
+        if self.artifacts is None:
+            return {'video': paths[0]}
+        entry = self.artifacts.register(url, paths[0], failed=failed)
+        return {key: entry[key] for key in ('run_id', 'video', 'gif', 'thumbnail') if entry[key] is not None}
+
+    async def extract_from_html(self, url, html):
+        # Only the main-content region is sent; navigation and sidebars are
+        # pruned first.
+        with self.tracer.span('dom_prune') as span:
+            text, tokens = main_text(url, html)
+            span.set(**tokens)
+        # Concurrent pages share one batched call; a page the batch could
+        # not handle gets a call of its own below.
+        if self.batcher is not None:
+            try:
+                return await self.batcher.extract(url, text), {**tokens, 'batched': True}
+            except ValueError:
+                pass
+        messages = [
+            SystemMessage(content="You extract book details from product page text."),
+            UserMessage(content=HTML_EXTRACT_PROMPT.format(url=url, text=text)),
+        ]
+        response = await self.llm.ainvoke(messages, output_format=BookRecord)
+        return parse_record(response.completion), tokens
+
+    async def parse_agent_result(self, raw):
+        # Validate once; a malformed result gets a single cheap repair call
+        # against the schema instead of a full agent rerun.
+        try:
+            return parse_record(raw)
+        except ValueError as e:
+            error = e
+        if not raw:
+            raise ValueError(f"agent returned no result ({validation_error_text(error)})")
+        messages = [
+            SystemMessage(content="You convert extracted book data into the required structured format."),
+            UserMessage(content=REPAIR_PROMPT.format(errors=validation_error_text(error), raw=raw)),
+        ]
+        response = await self.llm.ainvoke(messages, output_format=BookRecord)
+        return parse_record(response.completion)
+
+    async def run_agent(self, url, context, page):
+        # browser_use drives Chromium over CDP and sees every tab of the
+        # browser, so the agent takes the pooled browser to itself and is
+        # focused on the page we already loaded and pruned.
+        cdp = await context.new_cdp_session(page)
+        target_id = (await cdp.send('Target.getTargetInfo'))['targetInfo']['targetId']
+        await cdp.detach()
+        async with self.pool.exclusive(context) as cdp_url:
+            return await self.drive_agent(url, cdp_url, target_id)
+
+    async def drive_agent(self, url, cdp_url, target_id):
+        # The page is already loaded, so later loads only need a short settle.
+        # The session only disconnects when the agent closes it; the browser
+        # belongs to the pool.
+        session = BrowserSession(
+            cdp_url=cdp_url,
+            minimum_wait_page_load_time=0.1,
+            wait_for_network_idle_page_load_time=0.5
+        )
+        try:
+            await session.start()
+            await session.get_or_create_cdp_session(target_id, focus=True)
+        except Exception:
+            await session.kill()
+            raise
+        agent = Agent(
+            task=build_task(url, preloaded=True),
+            llm=self.llm,
+            save_gif=self.profile['save_gif'],
+            browser_session=session,
+            output_model_schema=BookRecord,
+            # 'auto' keeps the screenshot action available to the model; the
+            # vision policy then decides per step what is sent unasked.
+            use_vision=True if self.vision is None or self.vision.mode == 'full' else 'auto'
+        )
+        vision = self.vision.session() if self.vision is not None else None
+
+        # Each agent step becomes a span; its llm_call children come from
+        # TracedLLM, so the rest of the step is DOM serialization and actions.
+        step_span = None
+
+        async def on_step_start(agent):
+            nonlocal step_span
+            step_span = self.tracer.start_span('agent_step', step=agent.state.n_steps)
+            if vision is not None:
+                step_span.set(vision=vision.before_step(agent))
+
+        async def on_step_end(agent):
+            nonlocal step_span
+            if vision is not None:
+                try:
+                    vision.after_step(agent)
+                except Exception as e:
+                    # Accounting only; never fail the run over it.
+                    print(f"Vision accounting failed: {type(e).__name__}: {e}")
+            if self.router is not None:
+                # A step that made no progress moves the agent to a stronger model.
+                self.router.step_done(agent.session_id, agent.state.consecutive_failures)
+            if step_span is not None:
+                step_span.end()
+                step_span = None
+
+        try:
+            return await agent.run(on_step_start=on_step_start, on_step_end=on_step_end)
+        finally:
+            if self.router is not None:
+                self.router.end_session(agent.session_id)
+
+
+async def iterate(urls):
+    # Lets the batch runner take a plain list or an async source such as the crawler.
+    if hasattr(urls, '__aiter__'):
+        async for url in urls:
+            yield url
+    else:
+        for url in urls:
+            yield url
+
+
+async def run_batch(urls, extractor, concurrency=4):
+    # Yields one record per URL in completion order; at most `concurrency`
+    # extractions are in flight and new URLs are only pulled when a slot frees up.
+    # If the URL source raises, the extractions in flight finish and the
+    # error is raised after their records.
+    semaphore = asyncio.Semaphore(concurrency)
+    results = asyncio.Queue()
+    running = set()
+
+    async def worker(url):
+        try:
+            record = await extractor.extract(url)
+        except Exception as e:
+            record = {'url': url, 'error': f"{type(e).__name__}: {e}"}
+        await results.put(record)
+        semaphore.release()
+
+    async def feed():
+        error = None
+        try:
+            async for url in iterate(urls):
+                await semaphore.acquire()
+                task = asyncio.create_task(worker(url))
+                running.add(task)
+                task.add_done_callback(running.discard)
+        except Exception as e:
+            error = e
+        for _ in range(concurrency):
+            await semaphore.acquire()
+        await results.put(error)
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while True:
+            record = await results.get()
+            if record is None:
+                break
+            if isinstance(record, Exception):
+                raise record
+            yield record
+    finally:
+        feeder.cancel()
+        for task in list(running):
+            task.cancel()
+
+
+def load_urls(args):
+    urls = list(args.url or [])
+    if args.urls_file:
+        with open(args.urls_file, encoding='utf-8') as f:
+            urls.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    return urls or [DEFAULT_URL]
+
+
+def build_request_filter(args, profile):
+    block_types = profile['block_resources']
+    if args.block_resources is not None:
+        block_types = [t for t in args.block_resources.split(',') if t]
+    deny_domains = list(DEFAULT_DENY_DOMAINS) + (args.deny_domain or [])
+    max_response_bytes = args.max_response_kb * 1024 if args.max_response_kb else None
+    return RequestFilter(block_types, args.allow_domain, deny_domains, max_response_bytes)
+
+
+def build_pool(args, profile, request_filter, tracer):
+    return BrowserPool.from_browser_config(
+        build_browser_config(profile),
+        size=args.browsers,
+        max_contexts_per_browser=args.contexts_per_browser,
+        recycle_after=args.recycle_after,
+        context_hooks=[request_filter.attach],
+        tracer=tracer
+    )
+
+
+def build_fetcher(args):
+    scheduler = DomainScheduler(
+        qps=args.qps or None,
+        burst=args.burst,
+        concurrency=args.http_per_host,
+        respect_robots=not args.ignore_robots
+    )
+    return HttpFetcher(scheduler, max_connections=args.http_connections)
+
+
+def build_extractor(args, pool, fetcher, profile, tracer):
+    # The router sits under the caches: a cached answer is good whichever
+    # model produced it, and only real calls count towards model latency.
+    models = [model for model in args.models.split(',') if model]
+    llm = router = ModelRouter([ChatGoogle(model=model) for model in models], tracer, hedge=not args.no_hedge)
+    llm_cache = None
+    if not args.no_llm_cache:
+        llm = llm_cache = CachingLLM(llm, args.llm_cache)
+    llm = TracedLLM(llm, tracer)
+    ready_timeout = args.ready_timeout
+    if ready_timeout is None:
+        ready_timeout = build_browser_config(profile)['wait_for_network_idle_page_load_time']
+    cache = None
+    if not args.no_cache:
+        cache = ResultCache(args.cache, ttl=args.cache_ttl * 3600, max_entries=args.cache_max_entries)
+    return Extractor(
+        llm, pool, fetcher, profile, tracer,
+        cache=cache,
+        llm_cache=llm_cache,
+        ready_timeout=ready_timeout,
+        ready_selectors=args.ready_selector,
+        tiers=[tier for tier in args.tiers.split(',') if tier],
+        flows=None if args.no_replay else FlowStore(args.flows),
+        batcher=LLMBatcher(llm, tracer, args.llm_batch, args.llm_batch_tokens) if args.llm_batch > 1 else None,
+        artifacts=build_artifacts(args, profile),
+        history=HistoryStore(args.history_dir) if profile['save_history'] else None,
+        vision=VisionPolicy(args.vision or profile['vision']),
+        router=router
     )
-    history = await agent.run() 
-    
-    
+
+
+def build_artifacts(args, profile):
+    config = build_browser_config(profile).get('record_video')
+    if config is None:
+        return None
+    return ArtifactManager(
+        config['dir'],
+        transcodes=[kind for kind in (args.video_artifacts or '').split(',') if kind],
+        workers=args.artifact_workers,
+        max_age=args.video_retention_days * 86400 if args.video_retention_days else None,
+        max_bytes=args.video_max_mb * 1024 * 1024 if args.video_max_mb else None
+    )
+
+
+async def skip_finished(urls, finished):
+    async for url in urls:
+        if url not in finished:
+            yield url
+
+
+def build_sink(args):
+    sinks = [JsonlSink(args.output, batch_size=args.flush_every)]
+    if args.csv:
+        sinks.append(CsvSink(args.csv, batch_size=args.flush_every))
+    if args.parquet:
+        sinks.append(ParquetSink(args.parquet))
+    return MultiSink(sinks)
+
+
+class Runtime:
+    # Everything one event loop needs to run extractions: profile, tracer,
+    # request filter, browser pool, HTTP fetcher and the extractor itself.
+    # Batch mode builds one; each worker process builds its own.
+
+    def __init__(self, args):
+        self.profile = load_profile(args.profile, args.record_video, args.video_sample_rate)
+        self.tracer = Tracer(args.trace, args.otel_endpoint)
+        self.request_filter = build_request_filter(args, self.profile)
+        self.pool = build_pool(args, self.profile, self.request_filter, self.tracer)
+        self.fetcher = build_fetcher(args)
+        self.extractor = build_extractor(args, self.pool, self.fetcher, self.profile, self.tracer)
+
+    async def __aenter__(self):
+        await self.pool.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        try:
+            await self.pool.close()
+        finally:
+            await self.extractor.close()
+            self.tracer.close()
+
+    def stats(self):
+        pool_stats = self.pool.stats()
+        filter_stats = self.request_filter.stats()
+        stats = {
+            'browsers_launched': pool_stats['launched'],
+            'browsers_recycled': pool_stats['recycled'],
+            'requests_blocked': sum(filter_stats['blocked'].values()),
+            'approx_bytes_saved': filter_stats['approx_bytes_saved'],
+            'domains': self.fetcher.scheduler.stats(),
+            'timing': {name: list(totals) for name, totals in self.tracer.totals.items()},
+        }
+        if self.extractor.cache is not None:
+            stats['cache'] = self.extractor.cache.stats()
+        if self.extractor.llm_cache is not None:
+            stats['llm_cache'] = self.extractor.llm_cache.stats()
+        if self.extractor.flows is not None:
+            stats['replay'] = self.extractor.flows.stats()
+        if self.extractor.batcher is not None:
+            stats['llm_batch'] = self.extractor.batcher.stats()
+        if self.extractor.artifacts is not None:
+            stats['artifacts'] = self.extractor.artifacts.stats()
+        if self.extractor.history is not None:
+            stats['history'] = self.extractor.history.stats()
+        if self.extractor.router is not None:
+            stats['models'] = self.extractor.router.stats()
+        if self.extractor.vision is not None:
+            stats['vision'] = self.extractor.vision.stats()
+        return stats
+
+
+def merge_stats(total, stats):
+    # Adds one runtime's stats into a running total (numbers are summed,
+    # max_* values keep the maximum).
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            merge_stats(total.setdefault(key, {}), value)
+        elif isinstance(value, list):
+            current = total.setdefault(key, [0] * len(value))
+            total[key] = [a + b for a, b in zip(current, value)]
+        elif key.startswith('max_'):
+            total[key] = max(total.get(key, value), value)
+        else:
+            total[key] = total.get(key, 0) + value
+    return total
+
+
+def print_stats(stats):
+    print(f"Browsers launched: {stats['browsers_launched']} (recycled {stats['browsers_recycled']})")
+    print(f"Requests blocked: {stats['requests_blocked']} (~{stats['approx_bytes_saved'] // 1024} KB saved)")
+    if 'cache' in stats:
+        print(f"Cache hits: {stats['cache']['hits']} ({stats['cache']['not_modified']} not modified), "
+              f"misses: {stats['cache']['misses']}")
+    for host, host_stats in stats['domains'].items():
+        avg_delay = host_stats['total_queue_delay'] / host_stats['requests'] if host_stats['requests'] else 0.0
+        print(f"{host}: {host_stats['requests']} requests, {host_stats['backoffs']} backoffs, "
+              f"queue delay avg {avg_delay:.3f}s / max {host_stats['max_queue_delay']}s")
+    if 'llm_cache' in stats:
+        llm_stats = stats['llm_cache']
+        print(f"LLM cache hits: {llm_stats['hits']}, misses: {llm_stats['misses']}, "
+              f"coalesced: {llm_stats['coalesced']}, tokens saved: {llm_stats['saved_tokens']}, "
+              f"store errors: {llm_stats['store_errors']}")
+    if 'artifacts' in stats:
+        artifact_stats = stats['artifacts']
+        print(f"Video artifacts: {artifact_stats['transcoded']} transcoded "
+              f"({artifact_stats['transcode_failures']} failed), {artifact_stats['evicted']} old runs evicted")
+    if 'history' in stats:
+        history_stats = stats['history']
+        print(f"Agent history: {history_stats['bytes_written'] // 1024} KB written, "
+              f"{history_stats['screenshots_stored']} screenshots stored, {history_stats['screenshots_deduped']} deduplicated")
+    for model, model_stats in stats.get('models', {}).items():
+        # Calls cancelled because their hedge answered first count as neither.
+        answered = model_stats['ok'] + model_stats['failed']
+        print(f"Model {model}: {model_stats['calls']} calls, {model_stats['ok'] / max(1, answered):.0%} succeeded, "
+              f"avg {model_stats['total_ms'] / max(1, model_stats['ok']):.0f} ms, p95 {model_stats['max_p95_ms']:.0f} ms, "
+              f"{model_stats['hedged']} hedged ({model_stats['hedge_wins']} won), "
+              f"{model_stats['escalations']} escalated, {model_stats['step_failures']} failed agent steps")
+    if 'vision' in stats:
+        vision_stats = stats['vision']
+        decisions = ', '.join(f"{name} {count}" for name, count in vision_stats['decisions'].items() if count)
+        print(f"Agent screenshots: {decisions or 'none'}; ~{vision_stats['image_tokens_saved']} image tokens "
+              f"and {vision_stats['bytes_saved'] // 1024} KB saved, {vision_stats['stale_skips']} skipped on a changed page")
+    if 'llm_batch' in stats:
+        batch_stats = stats['llm_batch']
+        print(f"LLM batches: {batch_stats['batches']} covering {batch_stats['items']} pages, "
+              f"{batch_stats['failed_items']} retried individually")
+    if 'replay' in stats:
+        replay_stats = stats['replay']
+        print(f"Flow replays: {replay_stats['replays']}, misses: {replay_stats['misses']}, "
+              f"flows learned: {replay_stats['learned']}")
+    print_timing(stats['timing'])
+
+
+async def batch_main(urls, args):
+    profile = load_profile(args.profile, args.record_video, args.video_sample_rate)
+    # One process: built up front so a crawler can share its fetcher.
+    runtime = Runtime(args) if args.workers <= 1 else None
+    crawler = feed = crawl_fetcher = None
+    if args.queue:
+        # Queue mode: the job queue decides what is left to do, so resume
+        # against --output is not needed.
+        jobs = JobQueue(args.queue, args.visibility_timeout, args.max_attempts)
+        if args.requeue_dead:
+            print(f"Requeued {jobs.requeue_dead()} dead-lettered jobs")
+        if args.url or args.urls_file:
+            print(f"Queued {jobs.enqueue(urls)} new of {len(urls)} URLs in {args.queue}")
+        feed = QueueFeed(jobs)
+        urls = feed.urls()
+        keep_alive = asyncio.create_task(feed.keep_alive())
+        print(f"Queue mode: {jobs.stats()}, concurrency {args.concurrency}, profile {profile['name']}")
+    elif args.crawl:
+        finished = set() if args.no_resume else completed_urls(args.output)
+        frontier = SqliteFrontier(args.crawl_state) if args.crawl_state else MemoryFrontier()
+        # Listing pages are on the same sites as the products, so they go
+        # through the same per-domain scheduler: the runtime's fetcher in
+        # one process, or one more share of --qps beside the workers.
+        if runtime is not None:
+            fetch_html = runtime.fetcher.fetch_html
+        else:
+            crawl_fetcher = build_fetcher(split_rate(args, args.workers + 1))
+            fetch_html = crawl_fetcher.fetch_html
+        crawler = Crawler(args.crawl, fetch_html, frontier, max_listing_pages=args.max_listing_pages)
+        urls = skip_finished(crawler.product_urls(), finished)
+        print(f"Crawl mode: starting from {', '.join(args.crawl)}, concurrency {args.concurrency}, profile {profile['name']}")
+    else:
+        # Resume: anything already in the JSONL output is not extracted again.
+        finished = set() if args.no_resume else completed_urls(args.output)
+        skipped = sum(1 for url in urls if url in finished)
+        urls = [url for url in urls if url not in finished]
+        if skipped:
+            print(f"Resuming: {skipped} URLs already in {args.output}")
+        print(f"Batch mode: {len(urls)} URLs, concurrency {args.concurrency}, profile {profile['name']}")
+    sink = build_sink(args)
+
+    done = failed = 0
+    try:
+        if runtime is None:
+            supervisor = Supervisor(args, args.workers, rate_shares=args.workers + (crawler is not None))
+            print(f"Running {args.workers} worker processes")
+            async for record in supervisor.run(urls):
+                done, failed = await handle_record(record, sink, feed, done, failed)
+            stats = supervisor.stats
+        else:
+            async with runtime:
+                async for record in run_batch(urls, runtime.extractor, args.concurrency):
+                    done, failed = await handle_record(record, sink, feed, done, failed)
+            stats = runtime.stats()
+    finally:
+        sink.close()
+        if crawl_fetcher is not None:
+            await crawl_fetcher.close()
+        if crawler is not None:
+            crawler.frontier.close()
+        if feed is not None:
+            keep_alive.cancel()
+            queue_stats = jobs.stats()
+            jobs.close()
+
+    print("=" * 60)
+    print(f"✅ BATCH COMPLETE: {done - failed}/{done} succeeded ✅")
+    print(f"Results written to: {args.output}")
+    if crawler is not None:
+        print(f"Listing pages fetched: {crawler.listing_pages}, new product pages found: {crawler.products_found}")
+    if feed is not None:
+        print(f"Queue: {queue_stats['done']} done, {queue_stats['dead']} dead-lettered, "
+              f"{queue_stats['pending'] + queue_stats['leased']} still open")
+    if stats:
+        print_stats(stats)
+    print("=" * 60)
+
+
+async def handle_record(record, sink, feed, done, failed):
+    done += 1
+    if 'error' in record:
+        failed += 1
+    # In queue mode only the first completion of a job reaches the sinks.
+    write = await feed.finish(record) if feed is not None else 'error' not in record
+    if write:
+        sink.write(record)
+    print(json.dumps(record, ensure_ascii=False), flush=True)
+    return done, failed
+
+
+def print_timing(totals):
+    print("\n--- TIME BY PHASE ---")
+    for name, (count, total_ms) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        print(f"{name:>16}: {count:>5} x {total_ms / count:>9.1f} ms = {total_ms / 1000:.1f} s")
+
+
+async def main(url, args):
+
+    runtime = Runtime(args)
+    profile = runtime.profile
+
+    print("Agent running... Waiting for browser automation to start.")
+
+    async with runtime:
+        record = await runtime.extractor.extract(url)
+        artifacts = runtime.extractor.artifacts
+        if record.get('run_id') and artifacts is not None:
+            # The transcodes may still be running; report the files they left.
+            # A run retention already evicted has no files left to report.
+            entry = await asyncio.to_thread(artifacts.settle, record['run_id'])
+            record.update({key: entry[key] if entry is not None else None for key in ('video', 'gif', 'thumbnail')})
+
+    if record.get('cached'):
+        print("♻️ Page unchanged since the last run, using the cached result.")
+        print("\n--- FINAL JSON OUTPUT ---")
+        print(json.dumps(record['result'], indent=2, ensure_ascii=False))
+        return
+
+    if record['source'] != 'agent':
+        if record['source'] == 'http_llm':
+            print("⚡ Page content was static HTML, extracted it without a browser.")
+        elif record['source'] == 'replay':
+            print("⚡ Replayed the flow learned for this site, skipping the agent.")
+        else:
+            print("⚡ Matched a known page layout, skipping the agent.")
+        print("\n--- FINAL JSON OUTPUT ---")
+        print(json.dumps(record['result'], indent=2, ensure_ascii=False))
+        return
+
     print("="*60)
     print("✅ AGENT RUN COMPLETE ✅")
     print("="*60)
-    
-    
-    final_json_output = history.final_result() 
+    print(f"Page ready after {record['ready_wait']:.2f}s")
+    tokens = record['tokens']
+    print(f"Page text pruned from ~{tokens['tokens_before']} to ~{tokens['tokens_after']} tokens")
+    for step, step_tokens in enumerate(tokens['step_input_tokens'], 1):
+        print(f"  step {step}: {step_tokens} input tokens")
+    print_timing(runtime.tracer.totals)
+
+
+    final_json_output = record['result']
     print("\n--- FINAL JSON OUTPUT ---")
-    print(final_json_output) 
-    
-    
-    video_files = glob.glob('videos/*.webm') + glob.glob('videos/*.mp4')
-    
-    if video_files:
-        
-        latest_video = max(video_files, key=os.path.getmtime)
+    print(json.dumps(final_json_output, indent=2, ensure_ascii=False))
+
+
+    latest_video = record.get('video')
+    if not latest_video and profile['record_video'] != 'always':
+        return
+
+    if latest_video:
+
         print(f"\n--- VIDEO OUTPUT PATH ---")
         print(f"Video (Visual Proof) is saved at: {latest_video}")
-        print("💡 Download this video file and convert it to a GIF for your submission.")
+        if record.get('gif'):
+            print(f"GIF is saved at: {record['gif']}")
+        else:
+            print("💡 Run with --video-artifacts gif to get a GIF alongside the video.")
     else:
         print("\n--- VISUAL PROOF NOT FOUND ---")
         print("🔴 Video/GIF failed to generate. Use the JSON output and try the conversion steps.")
-    
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extract book details with a browser agent")
+    parser.add_argument("--url", action="append", help="Product page URL (repeatable)")
+    parser.add_argument("--urls-file", type=str, help="File with one product URL per line")
+    parser.add_argument("--concurrency", type=int, default=4, help="Max extractions running at once in batch mode (per worker)")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, each with its own event loop and browser pool")
+    parser.add_argument("--browsers", type=int, default=1, help="Long-lived browsers in the batch pool")
+    parser.add_argument("--contexts-per-browser", type=int, default=4, help="Max concurrent contexts per pooled browser")
+    parser.add_argument("--recycle-after", type=int, default=200, help="Restart a pooled browser after this many contexts")
+    parser.add_argument("--ready-timeout", type=float, default=None, help="Ceiling in seconds for the page-readiness wait")
+    parser.add_argument("--ready-selector", action="append", help="CSS selector that must be present and stable before extraction (repeatable)")
+    parser.add_argument("--cache", type=str, default="cache/results.sqlite", help="SQLite file for cached extraction results")
+    parser.add_argument("--cache-ttl", type=float, default=168, help="Hours before a cached result expires")
+    parser.add_argument("--cache-max-entries", type=int, default=100_000, help="Cached results kept before the least recently used are evicted")
+    parser.add_argument("--no-cache", action="store_true", help="Always re-extract, ignoring cached results")
+    parser.add_argument("--llm-cache", type=str, default="cache/llm.sqlite", help="SQLite file for cached LLM responses")
+    parser.add_argument("--no-llm-cache", action="store_true", help="Send every LLM request upstream")
+    parser.add_argument("--profile", choices=PROFILES.keys(), help="Runtime profile (default: RUN_PROFILE from .env, else demo)")
+    parser.add_argument("--record-video", choices=RECORD_MODES, help="Override the profile's video recording mode")
+    parser.add_argument("--video-sample-rate", type=float, help="Fraction of runs recorded when --record-video=sample")
+    parser.add_argument("--video-artifacts", type=str, help="Comma-separated files to derive from each recording in the background (gif, thumbnail, mp4); needs ffmpeg")
+    parser.add_argument("--artifact-workers", type=int, default=2, help="Parallel ffmpeg transcodes")
+    parser.add_argument("--video-retention-days", type=float, help="Delete recordings older than this")
+    parser.add_argument("--video-max-mb", type=float, help="Delete the oldest recordings once videos/ grows past this")
+    parser.add_argument("--models", type=str, default="gemini-2.5-flash",
+                        help="Comma-separated Gemini models, cheapest first; calls escalate to the next one when the cheaper fails")
+    parser.add_argument("--no-hedge", action="store_true", help="Never send a duplicate request for a call slower than the model's p95")
+    parser.add_argument("--vision", choices=VISION_MODES,
+                        help="When the agent gets screenshots: every step (full), after failed steps (adaptive), or only on request (off); overrides the profile")
+    parser.add_argument("--history-dir", type=str, default="history", help="Where agent histories are stored when the profile saves them")
+    parser.add_argument("--block-resources", type=str,
+                        help=f"Comma-separated resource types to block ({', '.join(RESOURCE_TYPES)}); overrides the profile")
+    parser.add_argument("--allow-domain", action="append", help="Only load subresources from these domains (repeatable)")
+    parser.add_argument("--deny-domain", action="append", help="Never load requests to these domains (repeatable)")
+    parser.add_argument("--max-response-kb", type=int, help="Drop subresponses larger than this many KB")
+    parser.add_argument("--output", type=str, default="results.jsonl", help="JSONL file that batch results are appended to")
+    parser.add_argument("--csv", type=str, help="Also append batch results to this CSV file")
+    parser.add_argument("--parquet", type=str, help="Also write batch results to this Parquet file (needs pyarrow)")
+    parser.add_argument("--flush-every", type=int, default=50, help="Records buffered between fsynced writes")
+    parser.add_argument("--no-resume", action="store_true", help="Re-extract URLs already present in --output")
+    parser.add_argument("--crawl", action="append", help="Listing URL to crawl for product pages (repeatable)")
+    parser.add_argument("--crawl-state", type=str, help="SQLite frontier file so an interrupted crawl can resume")
+    parser.add_argument("--max-listing-pages", type=int, help="Stop following listing pages after this many")
+    parser.add_argument("--queue", type=str, help="SQLite job queue to pull URLs from; --url/--urls-file are added to it first")
+    parser.add_argument("--visibility-timeout", type=float, default=600, help="Seconds a leased job stays hidden from other consumers")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per job before it is dead-lettered")
+    parser.add_argument("--requeue-dead", action="store_true", help="Give dead-lettered jobs in --queue another round of attempts")
+    parser.add_argument("--http-connections", type=int, default=100, help="Max pooled HTTP connections")
+    parser.add_argument("--http-per-host", type=int, default=8, help="Max concurrent requests per domain")
+    parser.add_argument("--qps", type=float, default=5.0, help="Sustained requests per second per domain (0 = unlimited)")
+    parser.add_argument("--burst", type=int, default=5, help="Requests a domain may receive back-to-back before --qps applies")
+    parser.add_argument("--ignore-robots", action="store_true", help="Ignore robots.txt Disallow and Crawl-delay")
+    parser.add_argument("--trace", type=str, help="Append per-phase timing spans to this JSONL file")
+    parser.add_argument("--otel-endpoint", type=str, help="Also export spans to an OTLP/HTTP collector, e.g. http://localhost:4318")
+    parser.add_argument("--llm-batch", type=int, default=1,
+                        help="Pages packed into one LLM call on the static-HTML tier (needs --concurrency at least as high)")
+    parser.add_argument("--llm-batch-tokens", type=int, default=12_000, help="Token budget for one batched LLM call")
+    parser.add_argument("--flows", type=str, default="flows", help="Directory of per-site flows learned from agent runs")
+    parser.add_argument("--no-replay", action="store_true", help="Always run the agent instead of replaying learned flows")
+    parser.add_argument("--tiers", type=str, default=",".join(TIERS),
+                        help="Comma-separated extraction tiers to allow, cheapest first")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
 
-    asyncio.run(main())
+    args = parse_args()
+    urls = load_urls(args)
+    if len(urls) > 1 or args.urls_file or args.crawl or args.queue:
+        asyncio.run(batch_main(urls, args))
+    else:
+        asyncio.run(main(urls[0], args))
@@ -0,0 +1,47 @@
+import json
+import re
+
+from pydantic import AliasChoices, BaseModel, Field, ValidationError, field_validator
+
+
+class BookRecord(BaseModel):
+    # The one result contract for every extraction path. The aliases accept
+    # the key names earlier free-text runs produced (see output.json).
+    title: str = Field(min_length=1, validation_alias=AliasChoices('title', 'book_title'))
+    rating: int = Field(ge=1, le=5, validation_alias=AliasChoices('rating', '5_star_rating', 'star_rating'))
+    price: float = Field(ge=0)
+    description: str = Field(min_length=1, validation_alias=AliasChoices('description', 'product_description'))
+    availability: str = Field(min_length=1, validation_alias=AliasChoices('availability', 'stock_availability'))
+
+    @field_validator('price', mode='before')
+    @classmethod
+    def strip_currency(cls, value):
+        if isinstance(value, str):
+            return re.sub(r'[^\d.]', '', value)
+        return value
+
+
+SCHEMA_FIELDS = tuple(BookRecord.model_fields)
+
+
+def parse_record(raw):
+    # Accepts a model instance, a dict or the agent's final text (optionally
+    # wrapped in a ```json fence) and returns a validated BookRecord.
+    if isinstance(raw, BookRecord):
+        return raw
+    if isinstance(raw, str):
+        text = raw.strip()
+        fenced = re.search(r'```(?:json)?\s*(.*?)```', text, re.DOTALL)
+        if fenced:
+            text = fenced.group(1)
+        start, end = text.find('{'), text.rfind('}')
+        if start == -1 or end < start:
+            raise ValueError("no JSON object in agent output")
+        raw = json.loads(text[start:end + 1])
+    return BookRecord.model_validate(raw)
+
+
+def validation_error_text(error):
+    if isinstance(error, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+    return str(error)
@@ -0,0 +1,170 @@
+import csv
+import json
+import os
+import time
+
+from schema import SCHEMA_FIELDS
+
+
+FLAT_COLUMNS = ('url', 'source') + SCHEMA_FIELDS
+
+
+def flatten(record):
+    row = {'url': record['url'], 'source': record.get('source')}
+    row.update({field: record['result'].get(field) for field in SCHEMA_FIELDS})
+    return row
+
+
+class BufferedSink:
+    # Buffers records and writes them out in batches. The JSONL and CSV sinks
+    # fsync after every batch, so a crash loses at most one unflushed batch.
+
+    def __init__(self, path, batch_size=50, flush_interval=5.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def write(self, record):
+        self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._write_batch(self._buffer)
+            self.written += len(self._buffer)
+            self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+
+    def _write_batch(self, records):
+        raise NotImplementedError
+
+
+class JsonlSink(BufferedSink):
+
+    def __init__(self, path, **kwargs):
+        super().__init__(path, **kwargs)
+        # Terminate a line torn by a crash so the next record starts clean.
+        # Checked in binary: the tear can split a multi-byte character.
+        with open(path, 'ab+') as f:
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    f.write(b'\n')
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _write_batch(self, records):
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+
+class CsvSink(BufferedSink):
+
+    def __init__(self, path, **kwargs):
+        super().__init__(path, **kwargs)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', encoding='utf-8', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=FLAT_COLUMNS)
+        if new_file:
+            self._writer.writeheader()
+
+    def _write_batch(self, records):
+        self._writer.writerows(flatten(record) for record in records)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        super().close()
+        self._file.close()
+
+
+class ParquetSink(BufferedSink):
+    # Each flush becomes one row group. Parquet files cannot be appended to,
+    # so a resumed batch writes a new file next to the old one.
+
+    def __init__(self, path, batch_size=1000, **kwargs):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet output needs pyarrow: pip install pyarrow") from None
+        if os.path.exists(path):
+            root, ext = os.path.splitext(path)
+            path = f"{root}.{int(time.time())}{ext}"
+        super().__init__(path, batch_size=batch_size, **kwargs)
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._schema = pyarrow.schema([
+            ('url', pyarrow.string()),
+            ('source', pyarrow.string()),
+            ('title', pyarrow.string()),
+            ('rating', pyarrow.int64()),
+            ('price', pyarrow.float64()),
+            ('description', pyarrow.string()),
+            ('availability', pyarrow.string()),
+        ])
+        self._writer = None
+
+    def _write_batch(self, records):
+        columns = {column: [] for column in FLAT_COLUMNS}
+        for record in records:
+            for column, value in flatten(record).items():
+                columns[column].append(value)
+        table = self._pa.table(columns, schema=self._schema)
+        if self._writer is None:
+            self._writer = self._pq.ParquetWriter(self.path, self._schema)
+        self._writer.write_table(table)
+
+    def close(self):
+        super().close()
+        if self._writer is not None:
+            self._writer.close()
+
+
+class MultiSink:
+
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def write(self, record):
+        for sink in self.sinks:
+            sink.write(record)
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.flush()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def completed_urls(path):
+    # URLs that already have a record in a JSONL sink. A torn last line from
+    # a crash is ignored so the URL is simply extracted again, even when the
+    # tear split a multi-byte character.
+    urls = set()
+    if not os.path.exists(path):
+        return urls
+    with open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            try:
+                urls.add(json.loads(line)['url'])
+            except (ValueError, KeyError):
+                continue
+    return urls
@@ -0,0 +1,95 @@
+from urllib.parse import urlparse
+import re
+
+from bs4 import BeautifulSoup
+from pydantic import ValidationError
+
+from schema import BookRecord
+
+
+RATING_WORDS = {'One': 1, 'Two': 2, 'Three': 3, 'Four': 4, 'Five': 5}
+
+
+def _text(el):
+    return el.get_text(" ", strip=True)
+
+
+def _price(el):
+    return float(re.sub(r'[^\d.]', '', _text(el)))
+
+
+def _rating(el):
+    for cls in el.get('class', []):
+        if cls in RATING_WORDS:
+            return RATING_WORDS[cls]
+    return None
+
+
+# Per-site templates: field name -> (CSS selector, parser). A template only
+# counts as a hit when every field is found and the record validates.
+# 'main' is the content region kept when pages are pruned for the LLM;
+# 'links' tells the crawler which anchors lead to product pages and which to
+# further listing pages (pagination, categories).
+TEMPLATES = {
+    'books.toscrape.com': {
+        'name': 'books_toscrape_product',
+        'main': 'article.product_page',
+        'fields': {
+            'title': ('div.product_main h1', _text),
+            'rating': ('div.product_main p.star-rating', _rating),
+            'price': ('div.product_main p.price_color', _price),
+            'description': ('#product_description + p', _text),
+            'availability': ('div.product_main p.availability', _text),
+        },
+        'links': {
+            'product': ['article.product_pod h3 a'],
+            'listing': ['ul.pager li.next a', 'div.side_categories ul li a'],
+        },
+    },
+}
+
+
+def register_template(domain, name, fields, links=None, main=None):
+    TEMPLATES[domain] = {'name': name, 'fields': fields, 'links': links or {}, 'main': main}
+
+
+def find_template(url):
+    host = (urlparse(url).hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    return TEMPLATES.get(host)
+
+
+def validate_record(record):
+    try:
+        return BookRecord.model_validate(record).model_dump()
+    except ValidationError:
+        return None
+
+
+def extract_with_template(url, html):
+    # Returns the extracted record, or None when there is no template for the
+    # site, a selector misses, or the values do not validate.
+    template = find_template(url)
+    if template is None:
+        return None
+
+    soup = BeautifulSoup(html, 'html.parser')
+    record = {}
+    for field, (selector, parse) in template['fields'].items():
+        el = soup.select_one(selector)
+        if el is None:
+            return None
+        try:
+            record[field] = parse(el)
+        except (ValueError, TypeError):
+            return None
+
+    return validate_record(record)
+
+
+def readiness_selectors(url):
+    template = find_template(url)
+    if template is None:
+        return []
+    return [selector for selector, _ in template['fields'].values()]
@@ -0,0 +1,14 @@
+import os
+
+import pytest
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+@pytest.fixture
+def load_fixture():
+    def load(name):
+        with open(os.path.join(FIXTURES, name), encoding='utf-8') as f:
+            return f.read()
+    return load
@@ -0,0 +1,63 @@
+from dom_prune import content_fingerprint, main_text, prune_html
+
+
+BOOK_URL = 'https://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html'
+GENERIC_URL = 'https://harbor-books.example/poetry/the-night-garden'
+
+
+def test_template_region_keeps_fields_and_drops_sidebar(load_fixture):
+    text, tokens = main_text(BOOK_URL, load_fixture('books_toscrape_product.html'))
+    assert 'A Light in the Attic' in text
+    assert '51.77' in text
+    assert 'In stock (22 available)' in text
+    assert "It's hard to imagine a world" in text
+    assert 'We love being scraped' not in text
+    assert tokens['tokens_after'] < tokens['tokens_before']
+
+
+def test_generic_region_keeps_header_and_form_inside_content(load_fixture):
+    text = prune_html(GENERIC_URL, load_fixture('generic_product.html')).get_text('\n', strip=True)
+    # The title sits in the article's <header>, price and stock in the
+    # add-to-cart <form>.
+    assert 'The Night Garden' in text
+    assert '$12.99' in text
+    assert 'In stock (7 available)' in text
+    assert 'owls, moths' in text
+
+
+def test_generic_region_drops_page_chrome(load_fixture):
+    text = prune_html(GENERIC_URL, load_fixture('generic_product.html')).get_text('\n', strip=True)
+    for boilerplate in ('Search books', 'New arrivals', 'We use cookies', 'Bestsellers',
+                        'Customers also bought', 'Share on social media', 'Free shipping'):
+        assert boilerplate not in text
+
+
+def test_page_without_region_keeps_heading_in_header():
+    html = """
+    <html><body>
+      <nav>Home | Shop | About</nav>
+      <header><h1>Moth Light</h1></header>
+      <form><span>$8.50</span><span>Only 2 left</span></form>
+      <footer>Company footer</footer>
+    </body></html>
+    """
+    text = prune_html(GENERIC_URL, html).get_text('\n', strip=True)
+    assert 'Moth Light' in text
+    assert '$8.50' in text
+    assert 'Home | Shop' not in text
+    assert 'Company footer' not in text
+
+
+def test_fingerprint_changes_with_price_without_template(load_fixture):
+    html = load_fixture('generic_product.html')
+    before = content_fingerprint(GENERIC_URL, html)
+    assert content_fingerprint(GENERIC_URL, html.replace('$12.99', '$99.00')) != before
+    # Scripts are not content.
+    assert content_fingerprint(GENERIC_URL, html.replace('8f2c9a', '0b77e1')) == before
+
+
+def test_fingerprint_ignores_chrome_outside_template_region(load_fixture):
+    html = load_fixture('books_toscrape_product.html')
+    before = content_fingerprint(BOOK_URL, html)
+    assert content_fingerprint(BOOK_URL, html.replace('We love being scraped!', 'Summer sale!')) == before
+    assert content_fingerprint(BOOK_URL, html.replace('&pound;51.77</p>', '&pound;49.99</p>')) != before
@@ -0,0 +1,38 @@
+from fetcher import needs_javascript
+from run_agent import Extractor
+from tracing import Tracer
+
+
+BOOK_URL = 'https://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html'
+NOSCRIPT = '<noscript><div class="alert">Please enable JavaScript for the best experience.</div></noscript>'
+
+
+def with_banner(html, nonce):
+    return html.replace('<body id="default" class="default">',
+                        f'<body id="default" class="default">{NOSCRIPT}<script nonce="{nonce}">init()</script>')
+
+
+def test_static_pages_do_not_need_javascript(load_fixture):
+    for name in ('books_toscrape_product.html', 'generic_product.html'):
+        assert not needs_javascript(load_fixture(name))
+
+
+def test_noscript_banner_does_not_make_a_static_page_a_shell(load_fixture):
+    html = with_banner(load_fixture('books_toscrape_product.html'), 'a1b2')
+    assert 'enable javascript' in html.lower()
+    assert not needs_javascript(html)
+
+
+def test_script_nonce_does_not_change_the_fingerprint(load_fixture):
+    extractor = Extractor(None, None, None, {'name': 'test'}, Tracer())
+    html = load_fixture('books_toscrape_product.html')
+    assert extractor.fingerprint(BOOK_URL, with_banner(html, 'a1b2')) == \
+        extractor.fingerprint(BOOK_URL, with_banner(html, 'c3d4'))
+
+
+def test_app_shell_needs_javascript():
+    shell = ('<html><head><script src="/app.js"></script></head>'
+             '<body><div id="root"></div><noscript>You need to enable JavaScript to run this app.</noscript></body></html>')
+    assert needs_javascript(shell)
+    notice = '<html><body><p>This site requires JavaScript.</p></body></html>'
+    assert needs_javascript(notice)
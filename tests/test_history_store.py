@@ -0,0 +1,75 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from browser_use.agent.views import ActionResult, AgentHistory, AgentHistoryList
+from browser_use.browser.views import BrowserStateHistory
+
+from history_store import HistoryStore
+
+
+URL = 'https://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html'
+FINAL = '{"title": "A Light in the Attic", "rating": 3}'
+
+
+def make_history(screenshots):
+    steps = []
+    for step, screenshot in enumerate(screenshots):
+        done = step == len(screenshots) - 1
+        result = ActionResult(is_done=True, success=True, extracted_content=FINAL) if done else \
+            ActionResult(extracted_content=f"step {step}")
+        state = BrowserStateHistory(url=URL, title='A Light in the Attic', tabs=[], interacted_element=[],
+                                    screenshot_path=screenshot)
+        steps.append(AgentHistory(model_output=None, result=[result], state=state))
+    return AgentHistoryList(history=steps)
+
+
+def screenshot(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_write_then_read_back(tmp_path):
+    store = HistoryStore(str(tmp_path / 'history'))
+    same = b'\x89PNG same viewport'
+    history = make_history([
+        screenshot(tmp_path, 'a.png', same),
+        screenshot(tmp_path, 'b.png', same),
+        screenshot(tmp_path, 'c.png', b'\x89PNG after the click'),
+    ])
+    run_id = store.write(URL, history)
+
+    assert store.final_result(run_id) == FINAL
+    steps = list(store.steps(run_id))
+    assert [step['result'][0]['extracted_content'] for step in steps] == ['step 0', 'step 1', FINAL]
+    names = [step['state']['screenshot'] for step in steps]
+    assert names[0] == names[1] != names[2]
+    with open(store.screenshot_path(names[0]), 'rb') as f:
+        assert f.read() == same
+    assert [run['run_id'] for run in store.runs(url=URL)] == [run_id]
+    assert store.stats()['screenshots_stored'] == 2
+    assert store.stats()['screenshots_deduped'] == 1
+    store.close()
+
+
+def test_concurrent_writers_store_the_same_screenshot(tmp_path, monkeypatch):
+    store = HistoryStore(str(tmp_path / 'history'))
+    paths = [screenshot(tmp_path, f"{i}.png", b'\x89PNG identical') for i in range(2)]
+    # Both writers have written their temp file before either renames it.
+    barrier = threading.Barrier(2, timeout=5)
+    replace = os.replace
+
+    def racing_replace(source, target):
+        barrier.wait()
+        replace(source, target)
+
+    monkeypatch.setattr(os, 'replace', racing_replace)
+    with ThreadPoolExecutor(2) as pool:
+        run_ids = list(pool.map(lambda path: store.write(URL, make_history([path])), paths))
+    assert all(store.final_result(run_id) == FINAL for run_id in run_ids)
+    assert store.stats()['screenshots_stored'] == 2
+    stored = [name for _, _, files in os.walk(store.screenshot_dir) for name in files]
+    # One image and no temp files left behind.
+    assert len(stored) == 1 and stored[0].endswith('.png')
+    store.close()
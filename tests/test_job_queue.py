@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+from job_queue import JobQueue, QueueFeed
+
+
+URL = 'https://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html'
+
+
+def make_queue(tmp_path, consumer, **kwargs):
+    kwargs.setdefault('visibility_timeout', 0.2)
+    kwargs.setdefault('retry_backoff', 0.0)
+    return JobQueue(str(tmp_path / 'jobs.sqlite'), consumer=consumer, **kwargs)
+
+
+def test_expired_lease_goes_to_another_consumer(tmp_path):
+    first, second = make_queue(tmp_path, 'a'), make_queue(tmp_path, 'b')
+    first.enqueue([URL])
+    [(url, first_token)] = first.lease()
+    assert second.lease() == []
+
+    time.sleep(0.3)
+    [(url, second_token)] = second.lease()
+    assert not first.extend(url, first_token)
+    assert second.extend(url, second_token)
+
+    # The first consumer still finishes; only one completion is stored.
+    assert first.complete(url, first_token, {'url': url, 'result': {'title': 'first'}})
+    assert not second.complete(url, second_token, {'url': url, 'result': {'title': 'second'}})
+    assert first.results() == [{'url': url, 'result': {'title': 'first'}}]
+    first.close()
+    second.close()
+
+
+def test_failed_job_is_dead_lettered_after_max_attempts(tmp_path):
+    jobs = make_queue(tmp_path, 'a', max_attempts=2)
+    jobs.enqueue([URL])
+    for attempt in range(2):
+        [(url, token)] = jobs.lease()
+        assert jobs.fail(url, token, f"timeout {attempt}")
+    assert jobs.lease() == []
+    assert jobs.next_available() is None
+    assert jobs.dead_letters() == [{'url': URL, 'attempts': 2, 'error': 'timeout 1'}]
+
+    assert jobs.requeue_dead() == 1
+    assert [url for url, _ in jobs.lease()] == [URL]
+    jobs.close()
+
+
+def test_expired_last_attempt_is_dead_lettered(tmp_path):
+    jobs = make_queue(tmp_path, 'a', max_attempts=1)
+    jobs.enqueue([URL])
+    [(url, token)] = jobs.lease()
+    time.sleep(0.3)
+    assert jobs.lease() == []
+    assert jobs.stats()['dead'] == 1
+    assert jobs.dead_letters()[0]['error'] == 'lease expired'
+    # A consumer whose lease ran out cannot fail the job a second time.
+    assert not jobs.fail(url, token, 'late failure')
+    jobs.close()
+
+
+def test_feed_retries_a_failed_job_then_stops(tmp_path):
+    jobs = make_queue(tmp_path, 'a', max_attempts=2)
+    jobs.enqueue([URL])
+    feed = QueueFeed(jobs, poll_interval=0.05)
+
+    async def consume():
+        attempts, written = 0, []
+        async for url in feed.urls():
+            attempts += 1
+            if attempts == 1:
+                record = {'url': url, 'error': 'timeout'}
+            else:
+                record = {'url': url, 'result': {'title': 'ok'}}
+            if await feed.finish(record):
+                written.append(record)
+        return attempts, written
+
+    attempts, written = asyncio.run(consume())
+    assert attempts == 2
+    assert written == [{'url': URL, 'result': {'title': 'ok'}}]
+    assert jobs.stats() == {'pending': 0, 'leased': 0, 'done': 1, 'dead': 0}
+    jobs.close()
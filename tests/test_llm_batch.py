@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+from fake_llm import FakeLLM, make_catalogue
+from llm_batch import LLMBatcher
+from tracing import Tracer
+
+
+BOOKS = make_catalogue(4, 20)
+PATHS = list(BOOKS)
+
+
+def url(path):
+    return f"http://127.0.0.1{path}"
+
+
+def page_text(path):
+    book = BOOKS[path]
+    return f"{book['title']}\n£{book['price']}\n{book['availability']}\n{book['description']}"
+
+
+def extract_all(batcher, pages):
+    async def run():
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.extract(url, text) for url, text in pages), return_exceptions=True), 5
+        )
+    return asyncio.run(run())
+
+
+def test_one_call_is_split_back_per_page():
+    llm = FakeLLM(BOOKS)
+    batcher = LLMBatcher(llm, Tracer(), max_items=8)
+    records = extract_all(batcher, [(url(path), page_text(path)) for path in PATHS[:3]])
+    assert [record.title for record in records] == [BOOKS[path]['title'] for path in PATHS[:3]]
+    assert llm.calls == 1
+    assert batcher.stats() == {'batches': 1, 'items': 3, 'failed_items': 0}
+
+
+def test_full_batch_is_sent_without_waiting():
+    llm = FakeLLM(BOOKS)
+    batcher = LLMBatcher(llm, Tracer(), max_items=2, max_wait=60)
+    records = extract_all(batcher, [(url(path), page_text(path)) for path in PATHS])
+    assert [record.title for record in records] == [BOOKS[path]['title'] for path in PATHS]
+    assert llm.calls == 2
+
+
+def test_page_missing_from_the_response_fails_alone():
+    batcher = LLMBatcher(FakeLLM(BOOKS), Tracer())
+    unknown = 'http://127.0.0.1/catalogue/not-in-catalogue_9/index.html'
+    found, missing = extract_all(batcher, [(url(PATHS[0]), page_text(PATHS[0])), (unknown, 'Unknown book')])
+    assert found.title == BOOKS[PATHS[0]]['title']
+    assert isinstance(missing, ValueError) and unknown in str(missing)
+    assert batcher.stats()['failed_items'] == 1
+
+
+def test_braces_in_page_text_are_sent_verbatim():
+    llm = FakeLLM(BOOKS)
+    batcher = LLMBatcher(llm, Tracer())
+    pages = [(url(path), 'Title {vol 2} {} {0}\n' + page_text(path)) for path in PATHS[:2]]
+    records = extract_all(batcher, pages)
+    assert [record.title for record in records] == [BOOKS[path]['title'] for path in PATHS[:2]]
+
+
+def test_token_budget_flushes_before_the_page_that_would_overflow():
+    llm = FakeLLM(BOOKS)
+    text = page_text(PATHS[0])
+    # Room for the prompt and one page, not two.
+    batcher = LLMBatcher(llm, Tracer(), token_budget=LLMBatcher(llm, Tracer()).overhead + len(text) // 4 + 40)
+    records = extract_all(batcher, [(url(path), page_text(path)) for path in PATHS[:2]])
+    assert [record.title for record in records] == [BOOKS[path]['title'] for path in PATHS[:2]]
+    assert batcher.stats()['batches'] == 2
+
+
+def test_failure_while_sending_reaches_every_caller():
+    class BrokenTracer(Tracer):
+        def span(self, name, **attrs):
+            raise RuntimeError("tracer down")
+
+    batcher = LLMBatcher(FakeLLM(BOOKS), BrokenTracer())
+    results = extract_all(batcher, [(url(path), page_text(path)) for path in PATHS[:2]])
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_oversized_page_is_refused():
+    batcher = LLMBatcher(FakeLLM(BOOKS), Tracer(), token_budget=100)
+    with pytest.raises(ValueError, match='too large'):
+        asyncio.run(batcher.extract(url(PATHS[0]), 'word ' * 1000))
@@ -0,0 +1,100 @@
+import asyncio
+import sqlite3
+
+import pytest
+from browser_use.llm.messages import UserMessage
+
+from fake_llm import FakeLLM, make_catalogue
+from llm_cache import CachingLLM
+from schema import BookRecord
+
+
+BOOKS = make_catalogue(3, 20)
+PATH = next(iter(BOOKS))
+
+
+def messages(path=PATH):
+    return [UserMessage(content=f"Extract the book at http://127.0.0.1{path}")]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    llm = FakeLLM(BOOKS, latency=0.05)
+    cache = CachingLLM(llm, str(tmp_path / 'llm.sqlite'))
+    yield llm, cache
+    cache.close()
+
+
+def test_identical_prompts_share_one_call_then_hit_the_store(cache):
+    llm, cache = cache
+
+    async def run():
+        first = await asyncio.gather(*(cache.ainvoke(messages(), BookRecord) for _ in range(3)))
+        again = await cache.ainvoke(messages(), BookRecord)
+        return first, again
+
+    first, again = asyncio.run(run())
+    assert llm.calls == 1
+    assert {r.completion.title for r in first} == {again.completion.title}
+    assert cache.stats()['coalesced'] == 2
+    assert cache.stats()['hits'] == 1
+
+
+def test_cancelled_first_caller_does_not_cancel_the_others(cache):
+    llm, cache = cache
+
+    async def run():
+        first = asyncio.ensure_future(asyncio.wait_for(cache.ainvoke(messages(), BookRecord), 0.01))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.ainvoke(messages(), BookRecord, session_id='other'))
+        with pytest.raises(asyncio.TimeoutError):
+            await first
+        return await second
+
+    result = asyncio.run(run())
+    assert result.completion.title == BOOKS[PATH]['title']
+    assert llm.calls == 1
+
+
+def test_call_is_cancelled_when_nobody_waits(cache):
+    llm, cache = cache
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(cache.ainvoke(messages(), BookRecord), 0.01)
+        await asyncio.sleep(0.1)
+        assert not cache._inflight
+        # A later identical prompt starts a new request instead of joining
+        # the cancelled one.
+        return await cache.ainvoke(messages(), BookRecord)
+
+    assert asyncio.run(run()).completion.title == BOOKS[PATH]['title']
+    assert llm.calls == 1
+
+
+def test_upstream_error_reaches_every_waiter(cache):
+    llm, cache = cache
+
+    async def run():
+        bad = [UserMessage(content="no product here")]
+        return await asyncio.gather(*(cache.ainvoke(bad, BookRecord) for _ in range(2)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert not cache._inflight
+
+
+def test_store_failure_still_returns_the_answer(cache, tmp_path):
+    llm, cache = cache
+    # Another process holds the write lock for longer than the busy timeout.
+    other = sqlite3.connect(str(tmp_path / 'llm.sqlite'))
+    other.execute("BEGIN EXCLUSIVE")
+    cache._db.execute("PRAGMA busy_timeout = 50")
+    try:
+        result = asyncio.run(cache.ainvoke(messages(), BookRecord))
+    finally:
+        other.rollback()
+        other.close()
+    assert result.completion.title == BOOKS[PATH]['title']
+    assert cache.stats()['store_errors'] == 1
+    assert cache.stats()['hits'] == 0
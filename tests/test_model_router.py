@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import pytest
+from browser_use.llm.messages import UserMessage
+
+from fake_llm import FakeLLM, make_catalogue
+from model_router import ModelRouter
+from schema import BookRecord
+from tracing import Tracer
+
+
+BOOKS = make_catalogue(3, 20)
+PATH = next(iter(BOOKS))
+
+
+def messages(path=PATH):
+    return [UserMessage(content=f"Extract the book at http://127.0.0.1{path}")]
+
+
+class ScriptedLLM(FakeLLM):
+    # Takes its latency for each call from a list.
+
+    def __init__(self, books, delays, **kwargs):
+        super().__init__(books, **kwargs)
+        self.delays = list(delays)
+
+    async def ainvoke(self, messages, output_format=None, **kwargs):
+        self.latency = self.delays.pop(0)
+        return await super().ainvoke(messages, output_format, **kwargs)
+
+
+def attempts(path):
+    with open(path, encoding='utf-8') as f:
+        return [span for span in map(json.loads, f) if span['name'] == 'llm_attempt']
+
+
+def test_failed_call_escalates_and_moves_the_session_up(tmp_path):
+    cheap = FakeLLM(BOOKS, model='cheap', failure_rate=1.0)
+    strong = FakeLLM(BOOKS, model='strong')
+    tracer = Tracer(str(tmp_path / 'trace.jsonl'))
+    router = ModelRouter([cheap, strong], tracer, hedge=False)
+
+    async def run():
+        first = await router.ainvoke(messages(), BookRecord, session_id='agent-1')
+        second = await router.ainvoke(messages(), BookRecord, session_id='agent-1')
+        return first, second
+
+    first, second = asyncio.run(run())
+    tracer.close()
+    assert first.completion.title == second.completion.title == BOOKS[PATH]['title']
+    stats = router.stats()
+    # The session stays on the strong model once it has escalated.
+    assert (stats['cheap']['calls'], stats['strong']['calls']) == (1, 2)
+    assert stats['cheap']['escalations'] == 1
+    assert stats['cheap']['failed'] == 1
+    assert stats['strong']['ok'] == 2
+    failed = [span for span in attempts(tmp_path / 'trace.jsonl') if 'error' in span]
+    assert [span['model'] for span in failed] == ['cheap']
+    assert failed[0]['error'].startswith('ModelProviderError: ')
+
+
+def test_last_model_failing_raises():
+    router = ModelRouter([FakeLLM(BOOKS, failure_rate=1.0)], hedge=False)
+    with pytest.raises(Exception, match='output schema'):
+        asyncio.run(router.ainvoke(messages(), BookRecord))
+
+
+def test_failed_steps_escalate_the_session():
+    cheap, strong = FakeLLM(BOOKS, model='cheap'), FakeLLM(BOOKS, model='strong')
+    router = ModelRouter([cheap, strong], hedge=False, escalate_after=2)
+    router.step_done('agent-1', 1)
+    asyncio.run(router.ainvoke(messages(), BookRecord, session_id='agent-1'))
+    router.step_done('agent-1', 2)
+    asyncio.run(router.ainvoke(messages(), BookRecord, session_id='agent-1'))
+    # Other sessions and ended sessions start at the bottom again.
+    asyncio.run(router.ainvoke(messages(), BookRecord, session_id='agent-2'))
+    router.end_session('agent-1')
+    asyncio.run(router.ainvoke(messages(), BookRecord, session_id='agent-1'))
+    assert (cheap.calls, strong.calls) == (3, 1)
+    assert router.stats()['cheap']['step_failures'] == 2
+
+
+def test_slow_call_is_hedged_and_the_hedge_wins(tmp_path):
+    llm = ScriptedLLM(BOOKS, [0.01] * 3 + [1.0, 0.01])
+    tracer = Tracer(str(tmp_path / 'trace.jsonl'))
+    router = ModelRouter([llm], tracer, min_samples=3)
+
+    async def run():
+        for _ in range(3):
+            await router.ainvoke(messages(), BookRecord)
+        started = asyncio.get_running_loop().time()
+        result = await router.ainvoke(messages(), BookRecord)
+        return result, asyncio.get_running_loop().time() - started
+
+    result, elapsed = asyncio.run(run())
+    tracer.close()
+    assert result.completion.title == BOOKS[PATH]['title']
+    assert elapsed < 0.5
+    stats = router.stats()['fake-llm']
+    assert (stats['calls'], stats['hedged'], stats['hedge_wins']) == (5, 1, 1)
+    hedge, last = attempts(tmp_path / 'trace.jsonl')[-2:]
+    # The hedge answers first; the slow original is cancelled, not failed.
+    assert hedge['hedge'] and 'error' not in hedge
+    assert last['cancelled'] and not last['hedge'] and 'error' not in last
+
+
+def test_fast_call_is_not_hedged():
+    llm = ScriptedLLM(BOOKS, [0.05] * 4)
+    router = ModelRouter([llm], min_samples=3)
+
+    async def run():
+        for _ in range(4):
+            await router.ainvoke(messages(), BookRecord)
+
+    asyncio.run(run())
+    assert llm.calls == 4
+    assert router.stats()['fake-llm']['hedged'] == 0
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from email.utils import formatdate
+
+import httpx
+import pytest
+
+import run_agent
+from fetcher import HttpFetcher
+from rate_limit import DomainScheduler, RobotsDisallowed, TokenBucket, retry_after_seconds
+from run_agent import Extractor
+from tracing import Tracer
+
+
+ROBOTS = "User-agent: *\nDisallow: /private/\nCrawl-delay: 1\n"
+
+
+def mock_fetcher(scheduler, statuses=None):
+    # HttpFetcher over an in-process transport: /robots.txt serves ROBOTS,
+    # everything else answers with the next status from `statuses` (200 once
+    # they run out).
+    statuses = list(statuses or [])
+    seen = []
+
+    def handler(request):
+        if request.url.path == '/robots.txt':
+            return httpx.Response(200, text=ROBOTS)
+        seen.append(request.url.path)
+        status = statuses.pop(0) if statuses else 200
+        return httpx.Response(status, headers={'Retry-After': '0'}, text='<html><body>ok</body></html>')
+
+    fetcher = HttpFetcher(scheduler)
+    fetcher.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return fetcher, seen
+
+
+def test_token_bucket_allows_a_burst_then_paces():
+    async def run():
+        bucket = TokenBucket(rate=20, burst=3)
+        started = time.monotonic()
+        for _ in range(3):
+            await bucket.take()
+        burst = time.monotonic() - started
+        for _ in range(2):
+            await bucket.take()
+        return burst, time.monotonic() - started
+
+    burst, total = asyncio.run(run())
+    assert burst < 0.02
+    assert 0.08 <= total < 0.3
+
+
+def test_retry_after_accepts_seconds_and_dates():
+    assert retry_after_seconds({'retry-after': '7'}) == 7.0
+    assert retry_after_seconds({'retry-after': '-3'}) == 0.0
+    assert 25 < retry_after_seconds({'retry-after': formatdate(time.time() + 30, usegmt=True)}) <= 30
+    assert retry_after_seconds({'retry-after': 'soon'}) is None
+    assert retry_after_seconds({}) is None
+    assert retry_after_seconds(None) is None
+
+
+def test_backoff_doubles_and_resets():
+    scheduler = DomainScheduler(qps=None, max_backoff=5)
+    url = 'https://shop.example/a'
+    assert scheduler.record_response(url, 429) == 2
+    assert scheduler.record_response(url, 503) == 4
+    assert scheduler.record_response(url, 503) == 5
+    assert scheduler.record_response(url, 429, {'retry-after': '1'}) == 1
+    assert scheduler.record_response(url, 200) is None
+    assert scheduler.record_response(url, 429) == 2
+    # The pause is per domain.
+    assert scheduler._state('https://other.example/').paused_until == 0.0
+    assert scheduler.stats()['shop.example']['backoffs'] == 5
+
+
+def test_robots_disallow_and_crawl_delay():
+    scheduler = DomainScheduler(qps=100, burst=10)
+    fetcher, seen = mock_fetcher(scheduler)
+
+    async def run():
+        with pytest.raises(RobotsDisallowed):
+            await fetcher.fetch('https://shop.example/private/book')
+        assert await fetcher.fetch_html('https://shop.example/private/book') is None
+        started = time.monotonic()
+        for _ in range(2):
+            await fetcher.fetch('https://shop.example/book')
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(run())
+    assert seen == ['/book', '/book']
+    assert fetcher.robots_blocked == 2
+    # Crawl-delay overrides the configured rate and burst.
+    assert elapsed >= 0.95
+    state = scheduler._state('https://shop.example/')
+    assert state.bucket.rate == 1 and state.bucket.burst == 1
+
+
+def test_http_fetch_retries_after_backoff():
+    scheduler = DomainScheduler(qps=None, respect_robots=False)
+    fetcher, seen = mock_fetcher(scheduler, statuses=[429, 503])
+    result = asyncio.run(fetcher.fetch('https://shop.example/book'))
+    assert result.status == 200
+    assert len(seen) == 3
+
+
+class FakeResponse:
+
+    def __init__(self, status, headers=None):
+        self.status = status
+        self.headers = headers or {}
+
+
+class FakePage:
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.visits = 0
+
+    async def goto(self, url, **kwargs):
+        self.visits += 1
+        return FakeResponse(self.statuses.pop(0), {'retry-after': '0'})
+
+
+class FakeContext:
+
+    def __init__(self, page):
+        self.page = page
+
+    async def new_page(self):
+        return self.page
+
+
+class Rendered(Exception):
+    pass
+
+
+def extractor(fetcher):
+    profile = {'name': 'test', 'record_video': 'never'}
+    return Extractor(llm=None, pool=None, fetcher=fetcher, profile=profile, tracer=Tracer())
+
+
+def test_extractor_refuses_disallowed_urls_on_every_tier():
+    fetcher, seen = mock_fetcher(DomainScheduler(qps=None))
+    page = FakePage([200])
+
+    async def run():
+        with pytest.raises(RobotsDisallowed):
+            await extractor(fetcher).extract('https://shop.example/private/book')
+        with pytest.raises(RobotsDisallowed):
+            await extractor(fetcher).extract_in_browser('https://shop.example/private/book', FakeContext(page))
+
+    asyncio.run(run())
+    assert seen == []
+    assert page.visits == 0
+
+
+def test_browser_navigation_backs_off_on_429(monkeypatch):
+    async def rendered(*args):
+        raise Rendered()
+
+    monkeypatch.setattr(run_agent, 'wait_until_ready', rendered)
+    scheduler = DomainScheduler(qps=None, respect_robots=False)
+    fetcher, _ = mock_fetcher(scheduler)
+    page = FakePage([429, 200])
+    with pytest.raises(Rendered):
+        asyncio.run(extractor(fetcher).extract_in_browser('https://shop.example/book', FakeContext(page)))
+    assert page.visits == 2
+    assert scheduler.stats()['shop.example']['backoffs'] == 1
@@ -0,0 +1,114 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import result_cache
+from fetcher import FetchResult
+from result_cache import ResultCache
+from run_agent import Extractor
+from tracing import Tracer
+
+
+URL = 'https://harbor-books.example/poetry/the-night-garden'
+RESULT = {'title': 'The Night Garden', 'rating': 4, 'price': 12.99,
+          'description': 'Night-time poems.', 'availability': 'In stock (7 available)'}
+
+
+class StaticFetcher:
+
+    def __init__(self, html, headers=None):
+        self.html = html
+        self.headers = headers or {}
+
+    async def fetch(self, url, headers=None):
+        return FetchResult(url, 200, self.html, self.headers)
+
+
+def test_cached_record_has_no_per_run_fields(tmp_path, load_fixture):
+    cache = ResultCache(str(tmp_path / 'results.sqlite'))
+    extractor = Extractor(None, None, StaticFetcher(load_fixture('generic_product.html')),
+                          {'name': 'test'}, Tracer(), cache=cache)
+    runs = []
+
+    async def extract_uncached(url, html):
+        runs.append(url)
+        return {'url': url, 'source': 'agent', 'result': RESULT, 'run_id': 'abc123',
+                'video': 'videos/abc123.mp4', 'gif': 'videos/abc123.gif', 'history_id': 7}
+
+    extractor.extract_uncached = extract_uncached
+    first = asyncio.run(extractor.extract(URL))
+    again = asyncio.run(extractor.extract(URL))
+    cache.close()
+    assert first['video'] == 'videos/abc123.mp4'
+    assert len(runs) == 1
+    assert again['cached'] and again['result'] == RESULT
+    assert not {'run_id', 'video', 'gif', 'thumbnail', 'history_id'} & set(again)
+
+
+SCHEMA = 'task-schema'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(result_cache, 'time', SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+def test_entry_expires_after_ttl(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / 'results.sqlite'), ttl=60)
+    cache.put(URL, SCHEMA, 'fp', {'result': RESULT}, {'etag': '"v1"'})
+    clock.value += 59
+    assert cache.get(URL, SCHEMA, 'fp') == {'result': RESULT}
+    assert cache.conditional_headers(URL, SCHEMA) == {'If-None-Match': '"v1"'}
+    clock.value += 2
+    assert cache.get(URL, SCHEMA, 'fp') is None
+    # Nothing left to revalidate against either.
+    assert cache.conditional_headers(URL, SCHEMA) is None
+    assert cache.get_not_modified(URL, SCHEMA) is None
+    assert cache.stats() == {'hits': 1, 'misses': 2, 'not_modified': 0}
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / 'results.sqlite'), max_entries=2)
+    urls = [f"https://shop.example/book-{i}" for i in range(3)]
+    for url in urls:
+        clock.value += 1
+        cache.put(url, SCHEMA, 'fp', {'url': url}, {'etag': f'"{url}"'})
+    clock.value += 1
+    # Reading the oldest entry makes the second one the least recently used.
+    assert cache.get(urls[0], SCHEMA, 'fp') is not None
+    cache.evict()
+    assert cache.get(urls[1], SCHEMA, 'fp') is None
+    assert cache.conditional_headers(urls[1], SCHEMA) is None
+    assert cache.get(urls[0], SCHEMA, 'fp') == {'url': urls[0]}
+    assert cache.get(urls[2], SCHEMA, 'fp') == {'url': urls[2]}
+    cache.close()
+
+
+def test_conditional_request_and_not_modified(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / 'results.sqlite'))
+    assert cache.conditional_headers(URL, SCHEMA) is None
+    cache.put(URL, SCHEMA, 'fp', {'result': RESULT},
+              {'etag': '"v1"', 'last-modified': 'Tue, 01 Sep 2026 10:00:00 GMT'})
+    assert cache.conditional_headers(URL, SCHEMA) == {
+        'If-None-Match': '"v1"', 'If-Modified-Since': 'Tue, 01 Sep 2026 10:00:00 GMT'}
+    # The URL is normalized: an explicit default port does not matter.
+    assert cache.conditional_headers('https://harbor-books.example:443/poetry/the-night-garden', SCHEMA) is not None
+    assert cache.get_not_modified(URL, SCHEMA) == {'result': RESULT}
+    assert cache.stats()['not_modified'] == 1
+    cache.close()
+
+
+def test_hit_refreshes_the_validators(tmp_path, clock):
+    cache = ResultCache(str(tmp_path / 'results.sqlite'))
+    cache.put(URL, SCHEMA, 'fp', {'result': RESULT}, {'etag': '"v1"'})
+    # The body changed outside the fingerprinted region: same entry, new ETag.
+    assert cache.get(URL, SCHEMA, 'fp', {'etag': '"v2"'}) == {'result': RESULT}
+    assert cache.conditional_headers(URL, SCHEMA) == {'If-None-Match': '"v2"'}
+    # A response without validators cannot be revalidated.
+    assert cache.get(URL, SCHEMA, 'fp', {}) == {'result': RESULT}
+    assert cache.conditional_headers(URL, SCHEMA) is None
+    cache.close()
@@ -0,0 +1,42 @@
+import asyncio
+
+import pytest
+
+from crawler import Crawler
+from run_agent import run_batch
+
+
+class EchoExtractor:
+
+    async def extract(self, url):
+        await asyncio.sleep(0.01)
+        return {'url': url}
+
+
+def test_source_error_is_raised_after_records_in_flight():
+    async def urls():
+        yield 'https://example.com/a'
+        yield 'https://example.com/b'
+        raise RuntimeError("database is locked")
+
+    async def run():
+        records = []
+        with pytest.raises(RuntimeError, match="database is locked"):
+            async for record in run_batch(urls(), EchoExtractor(), concurrency=4):
+                records.append(record['url'])
+        return records
+
+    records = asyncio.run(asyncio.wait_for(run(), 5))
+    assert sorted(records) == ['https://example.com/a', 'https://example.com/b']
+
+
+def test_crawler_error_reaches_the_consumer():
+    async def fetch(url):
+        raise RuntimeError("frontier unavailable")
+
+    async def run():
+        crawler = Crawler(['https://books.toscrape.com/index.html'], fetch)
+        return [url async for url in crawler.product_urls()]
+
+    with pytest.raises(RuntimeError, match="frontier unavailable"):
+        asyncio.run(asyncio.wait_for(run(), 5))
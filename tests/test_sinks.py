@@ -0,0 +1,21 @@
+import json
+
+from sinks import JsonlSink, completed_urls
+
+
+def test_resume_after_tear_inside_multibyte_character(tmp_path):
+    path = tmp_path / 'out.jsonl'
+    done = json.dumps({'url': 'https://example.com/a', 'result': {'title': 'Café'}}, ensure_ascii=False)
+    torn = json.dumps({'url': 'https://example.com/b', 'result': {'title': 'Crème brûlée'}}, ensure_ascii=False)
+    data = (done + '\n' + torn).encode('utf-8')
+    # Cut the second record inside the two-byte 'è'.
+    path.write_bytes(data[:data.index('è'.encode('utf-8')) + 1])
+
+    assert completed_urls(str(path)) == {'https://example.com/a'}
+
+    sink = JsonlSink(str(path))
+    sink.write({'url': 'https://example.com/b', 'result': {'title': 'Crème brûlée'}})
+    sink.close()
+    assert completed_urls(str(path)) == {'https://example.com/a', 'https://example.com/b'}
+    lines = path.read_bytes().split(b'\n')
+    assert json.loads(lines[-2])['url'] == 'https://example.com/b'
@@ -0,0 +1,32 @@
+from site_templates import extract_with_template, readiness_selectors
+
+
+BOOK_URL = 'https://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html'
+
+
+def test_books_toscrape_template_extracts_every_field(load_fixture):
+    record = extract_with_template(BOOK_URL, load_fixture('books_toscrape_product.html'))
+    assert record['title'] == 'A Light in the Attic'
+    assert record['rating'] == 3
+    assert record['price'] == 51.77
+    assert record['availability'] == 'In stock (22 available)'
+    assert record['description'].startswith("It's hard to imagine a world without A Light in the Attic.")
+
+
+def test_www_prefix_uses_the_same_template(load_fixture):
+    url = BOOK_URL.replace('://books.', '://www.books.')
+    assert extract_with_template(url, load_fixture('books_toscrape_product.html'))['rating'] == 3
+
+
+def test_missing_field_is_a_miss(load_fixture):
+    html = load_fixture('books_toscrape_product.html').replace('star-rating Three', 'star-rating')
+    assert extract_with_template(BOOK_URL, html) is None
+    html = load_fixture('books_toscrape_product.html').replace('price_color', 'price')
+    assert extract_with_template(BOOK_URL, html) is None
+
+
+def test_unknown_site_has_no_template(load_fixture):
+    url = 'https://harbor-books.example/poetry/the-night-garden'
+    assert extract_with_template(url, load_fixture('generic_product.html')) is None
+    assert readiness_selectors(url) == []
+    assert 'div.product_main h1' in readiness_selectors(BOOK_URL)
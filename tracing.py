@@ -0,0 +1,173 @@
+from contextlib import contextmanager
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+
+
+def _load_otel(endpoint, service_name):
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        raise RuntimeError(
+            "OpenTelemetry export needs opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http"
+        ) from None
+    provider = TracerProvider(resource=Resource.create({'service.name': service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=f"{endpoint.rstrip('/')}/v1/traces")))
+    return trace, provider
+
+
+class Span:
+
+    def __init__(self, tracer, name, attrs):
+        parent = _current_span.get()
+        self.tracer = tracer
+        self.name = name
+        self.attrs = dict(attrs)
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.start = time.time()
+        self.children_ms = {}
+        self._started = time.perf_counter()
+        self._token = _current_span.set(self)
+        self.otel_span = None
+        if tracer.otel is not None:
+            otel_trace, provider = tracer.otel
+            context = None
+            if parent is not None and parent.otel_span is not None:
+                context = otel_trace.set_span_in_context(parent.otel_span)
+            self.otel_span = provider.get_tracer('run_agent').start_span(name, context=context)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def end(self, error=None):
+        duration_ms = (time.perf_counter() - self._started) * 1000
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Ended from a different context than it was started in.
+            pass
+        if error is not None:
+            self.attrs['error'] = f"{type(error).__name__}: {error}"
+        self.tracer.export(self, duration_ms)
+
+
+class Tracer:
+    # Per-phase timing. Spans nest through a context variable, so every
+    # phase of one URL shares a trace id even across awaits. Finished spans
+    # go to a JSON-lines file and, optionally, to an OTLP/HTTP collector.
+
+    def __init__(self, path=None, otel_endpoint=None, service_name='run_agent'):
+        self._file = None
+        self._lock = threading.Lock()
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, 'a', encoding='utf-8')
+        self.otel = _load_otel(otel_endpoint, service_name) if otel_endpoint else None
+        self.totals = {}
+
+    def start_span(self, name, **attrs):
+        return Span(self, name, attrs)
+
+    @contextmanager
+    def span(self, name, **attrs):
+        span = self.start_span(name, **attrs)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        span.end()
+
+    def export(self, span, duration_ms):
+        count, total = self.totals.get(span.name, (0, 0.0))
+        self.totals[span.name] = (count + 1, total + duration_ms)
+        if span.parent is not None:
+            # Lets a parent report how much of its time went to e.g. LLM calls.
+            span.parent.children_ms[span.name] = span.parent.children_ms.get(span.name, 0.0) + duration_ms
+        if span.children_ms:
+            span.attrs['children_ms'] = {name: round(ms, 3) for name, ms in span.children_ms.items()}
+
+        if span.otel_span is not None:
+            for key, value in span.attrs.items():
+                if isinstance(value, (str, bool, int, float)):
+                    span.otel_span.set_attribute(key, value)
+            span.otel_span.end()
+
+        if self._file is None:
+            return
+        line = json.dumps({
+            'trace_id': span.trace_id,
+            'span_id': span.span_id,
+            'parent_id': span.parent.span_id if span.parent else None,
+            'name': span.name,
+            'start': span.start,
+            'duration_ms': round(duration_ms, 3),
+            **span.attrs,
+        }, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def summary(self):
+        return {
+            name: {'count': count, 'avg_ms': round(total / count, 1), 'total_ms': round(total, 1)}
+            for name, (count, total) in sorted(self.totals.items(), key=lambda item: -item[1][1])
+        }
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self.otel is not None:
+            self.otel[1].shutdown()
+
+
+class TracedLLM:
+    # Wraps a browser_use chat model and records each call as an llm_call
+    # span with its token counts.
+
+    def __init__(self, llm, tracer):
+        self.llm = llm
+        self.tracer = tracer
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    @property
+    def model(self):
+        return self.llm.model
+
+    @property
+    def provider(self):
+        return self.llm.provider
+
+    @property
+    def name(self):
+        return self.llm.name
+
+    @property
+    def model_name(self):
+        return self.llm.model_name
+
+    async def ainvoke(self, messages, output_format=None, **kwargs):
+        with self.tracer.span('llm_call', model=self.llm.model, messages=len(messages)) as span:
+            result = await self.llm.ainvoke(messages, output_format, **kwargs)
+            if result.usage is not None:
+                span.set(
+                    prompt_tokens=result.usage.prompt_tokens,
+                    completion_tokens=result.usage.completion_tokens
+                )
+            return result
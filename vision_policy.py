@@ -0,0 +1,142 @@
+import base64
+import hashlib
+import io
+import math
+
+from replay import PASSIVE_ACTIONS
+
+
+VISION_MODES = ('off', 'adaptive', 'full')
+
+# Gemini bills an image as 258 tokens per 768x768 tile.
+TILE = 768
+TOKENS_PER_TILE = 258
+
+
+def image_tokens(width, height):
+    return TOKENS_PER_TILE * math.ceil(width / TILE) * math.ceil(height / TILE)
+
+
+def _screenshot_size(data):
+    # PNG stores width and height in the IHDR chunk at bytes 16-24.
+    if data[:8] == b'\x89PNG\r\n\x1a\n' and len(data) >= 24:
+        return int.from_bytes(data[16:20], 'big'), int.from_bytes(data[20:24], 'big')
+    try:
+        from PIL import Image
+        with Image.open(io.BytesIO(data)) as image:
+            return image.size
+    except Exception:
+        return None
+
+
+class VisionPolicy:
+    # Decides per agent step whether the model gets a screenshot.
+    #
+    #   full      every step, full size (the old behaviour)
+    #   off       only when the model asks for one with the screenshot action
+    #   adaptive  text first: no screenshot while steps succeed; a reduced,
+    #             low-detail one after a failed step; full size once failures
+    #             repeat. None is sent after a failed step that only read the
+    #             page: the viewport has not changed since the last one sent.
+    #
+    # The model can always request a screenshot itself (use_vision='auto').
+    # Counters estimate the bytes and image tokens saved against `full`.
+
+    def __init__(self, mode='adaptive', low_size=(768, 480), full_after=2):
+        if mode not in VISION_MODES:
+            raise ValueError(f"unknown vision mode {mode!r}; choose from {', '.join(VISION_MODES)}")
+        self.mode = mode
+        self.low_size = low_size
+        self.full_after = full_after
+        self.decisions = dict.fromkeys(('full', 'low', 'skip', 'requested'), 0)
+        self.bytes_saved = 0
+        self.image_tokens_saved = 0
+        self.stale_skips = 0
+
+    def session(self):
+        return VisionSession(self)
+
+    def decide(self, failures, last_sent, page_changed):
+        if self.mode == 'full':
+            return 'full'
+        if self.mode == 'off':
+            return 'skip'
+        if failures >= self.full_after:
+            return 'full'
+        if failures == 0:
+            return 'skip'
+        if last_sent is not None and not page_changed:
+            return 'skip'
+        return 'low'
+
+    def stats(self):
+        return {
+            'decisions': dict(self.decisions),
+            'bytes_saved': self.bytes_saved,
+            'image_tokens_saved': self.image_tokens_saved,
+            'stale_skips': self.stale_skips,
+        }
+
+
+class VisionSession:
+    # Per-agent state for a VisionPolicy, driven from on_step_start and
+    # on_step_end. Sizes are read from the screenshot browser_use saved for
+    # the step, so accounting happens after the step.
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.decision = None
+        self.unchanged = False
+        self.last_sent = None
+        self.manager = None
+        self.original_size = None
+
+    def before_step(self, agent):
+        manager = agent._message_manager
+        if self.manager is not manager:
+            self.manager = manager
+            self.original_size = manager.llm_screenshot_size
+        history = agent.history.history
+        actions = []
+        if history and history[-1].model_output is not None:
+            actions = [next(iter(action.model_dump(exclude_none=True)), None) for action in history[-1].model_output.action]
+        page_changed = not actions or any(name not in PASSIVE_ACTIONS for name in actions)
+        failures = agent.state.consecutive_failures
+        decision = self.policy.decide(failures, self.last_sent, page_changed)
+        # Skipped only because the page looked unchanged since the last one sent.
+        self.unchanged = decision == 'skip' and self.policy.mode == 'adaptive' and failures > 0
+        if decision == 'skip' and 'screenshot' in actions:
+            # The model asked to see the page; 'auto' sends it this step.
+            decision = 'requested'
+
+        agent.settings.use_vision = True if decision in ('full', 'low') else 'auto'
+        manager.llm_screenshot_size = self.policy.low_size if decision == 'low' else self.original_size
+        manager.vision_detail_level = 'low' if decision == 'low' else 'auto'
+        self.decision = decision
+        self.policy.decisions[decision] += 1
+        return decision
+
+    def after_step(self, agent):
+        history = agent.history.history
+        if self.decision is None or not history:
+            return
+        screenshot = history[-1].state.get_screenshot()
+        if not screenshot:
+            return
+        data = base64.b64decode(screenshot)
+        digest = hashlib.sha256(data).hexdigest()
+        size = _screenshot_size(data)
+        full_tokens = image_tokens(*size) if size else 0
+
+        if self.decision == 'skip':
+            self.policy.bytes_saved += len(data)
+            self.policy.image_tokens_saved += full_tokens
+            if self.unchanged and digest != self.last_sent:
+                self.policy.stale_skips += 1
+        elif self.decision == 'low' and size:
+            low_width, low_height = self.policy.low_size
+            ratio = min(1.0, (low_width * low_height) / (size[0] * size[1]))
+            self.policy.bytes_saved += int(len(data) * (1 - ratio))
+            self.policy.image_tokens_saved += max(0, full_tokens - image_tokens(low_width, low_height))
+        if self.decision in ('full', 'low', 'requested'):
+            self.last_sent = digest
@@ -0,0 +1,164 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+
+
+# Sent on the task queue once per worker when there are no more URLs.
+_STOP = None
+
+
+def split_rate(args, shares):
+    # The per-domain rate is a total: processes fetching the same sites each
+    # get an equal share of --qps and --burst.
+    args = type(args)(**vars(args))
+    if args.qps:
+        args.qps = args.qps / shares
+        args.burst = max(1, args.burst // shares)
+    return args
+
+
+def _worker_args(args, worker_id, rate_shares):
+    # Each worker writes its own trace file and caches stay shared (SQLite in
+    # WAL mode with a 30 s busy timeout; a cache write that still fails is
+    # logged, not fatal). The per-domain rate is split across
+    # workers (and a crawler, if one shares the sites) so the total stays at
+    # --qps.
+    args = split_rate(args, rate_shares)
+    if args.trace:
+        root, ext = os.path.splitext(args.trace)
+        args.trace = f"{root}.worker{worker_id}{ext or '.jsonl'}"
+    return args
+
+
+async def _worker_urls(tasks):
+    loop = asyncio.get_running_loop()
+    while True:
+        url = await loop.run_in_executor(None, tasks.get)
+        if url is _STOP:
+            return
+        yield url
+
+
+async def _worker_loop(worker_id, args, tasks, results):
+    # Imported here: run_agent imports this module for Supervisor.
+    from run_agent import Runtime, run_batch
+
+    async with Runtime(args) as runtime:
+        async for record in run_batch(_worker_urls(tasks), runtime.extractor, args.concurrency):
+            results.put(('record', worker_id, record))
+    results.put(('stats', worker_id, runtime.stats()))
+
+
+def worker_main(worker_id, rate_shares, args, tasks, results):
+    try:
+        asyncio.run(_worker_loop(worker_id, _worker_args(args, worker_id, rate_shares), tasks, results))
+    except BaseException as e:
+        results.put(('failed', worker_id, f"{type(e).__name__}: {e}"))
+        raise
+
+
+class Supervisor:
+    # Fans a URL stream out to N worker processes, each running its own event
+    # loop, browser pool and HTTP client, so one process's GIL and event loop
+    # stop being the ceiling. URLs go through a bounded queue (backpressure
+    # for crawl mode); records come back on a results queue. A worker that
+    # dies loses only the URLs it had in flight; resume picks those up on
+    # the next run since they never reached the output. `rate_shares` is
+    # how many processes split --qps, when more than the workers fetch.
+
+    def __init__(self, args, workers, queue_size=None, poll_interval=1.0, rate_shares=None):
+        self.args = args
+        self.workers = workers
+        self.rate_shares = rate_shares or workers
+        self.poll_interval = poll_interval
+        self.context = multiprocessing.get_context('spawn')
+        self.tasks = self.context.Queue(queue_size or workers * args.concurrency * 2)
+        self.results = self.context.Queue()
+        self.processes = {}
+        self.stats = {}
+        self.failures = {}
+        self._stopped = False
+
+    def _start(self):
+        for worker_id in range(self.workers):
+            process = self.context.Process(
+                target=worker_main,
+                args=(worker_id, self.rate_shares, self.args, self.tasks, self.results),
+                name=f"extract-worker-{worker_id}",
+                daemon=True
+            )
+            process.start()
+            self.processes[worker_id] = process
+
+    def _put(self, item):
+        # Blocks while the queue is full, but gives up once the supervisor
+        # stops so a dead pool of workers cannot hang the feeder thread.
+        while not self._stopped:
+            try:
+                self.tasks.put(item, timeout=self.poll_interval)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    async def _feed(self, urls):
+        from run_agent import iterate
+
+        loop = asyncio.get_running_loop()
+        async for url in iterate(urls):
+            if not await loop.run_in_executor(None, self._put, url):
+                return
+        for _ in range(self.workers):
+            await loop.run_in_executor(None, self._put, _STOP)
+
+    def _join(self):
+        for process in self.processes.values():
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+
+    def _collect(self, worker_stats):
+        from run_agent import merge_stats
+
+        for stats in worker_stats:
+            merge_stats(self.stats, stats)
+
+    async def run(self, urls):
+        loop = asyncio.get_running_loop()
+        self._start()
+        feeder = asyncio.create_task(self._feed(urls))
+        running = set(self.processes)
+        worker_stats = []
+        try:
+            while running:
+                try:
+                    kind, worker_id, payload = await loop.run_in_executor(
+                        None, self.results.get, True, self.poll_interval
+                    )
+                except queue.Empty:
+                    for worker_id in list(running):
+                        if not self.processes[worker_id].is_alive():
+                            running.discard(worker_id)
+                            self.failures.setdefault(
+                                worker_id, f"exited with code {self.processes[worker_id].exitcode}"
+                            )
+                    if feeder.done() and feeder.exception() is not None:
+                        raise feeder.exception()
+                    continue
+                if kind == 'record':
+                    yield payload
+                elif kind == 'stats':
+                    worker_stats.append(payload)
+                    running.discard(worker_id)
+                else:
+                    self.failures[worker_id] = payload
+                    running.discard(worker_id)
+        finally:
+            self._stopped = True
+            feeder.cancel()
+            # Joining blocks for up to five seconds per worker.
+            await loop.run_in_executor(None, self._join)
+            self._collect(worker_stats)
+            for worker_id, reason in sorted(self.failures.items()):
+                print(f"Worker {worker_id} failed: {reason}")